@@ -1,10 +1,20 @@
 from django.contrib import admin
-from .models import Exam, Session, Question, Answer
+from .models import Exam, ExamAudience, Session, Question, Answer, Regrade, RegradeChange
 
 
 class QuestionAdmin(admin.StackedInline):
     model = Question
     extra = 1
+    # the versions are kept by ExamAdmin.save_formset
+    exclude = ('version_added', 'version_removed', 'origin')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).current()
+
+
+class ExamAudienceAdmin(admin.TabularInline):
+    model = ExamAudience
+    extra = 0
 
 
 class ExamAdmin(admin.ModelAdmin):
@@ -12,15 +22,46 @@ class ExamAdmin(admin.ModelAdmin):
         'name',
         'user',
         'duration',
-        'get_num_questions',
-        'get_max_marks',
+        'num_questions',
+        'max_marks',
         'passing_percentage',
         'active',
         'created',
     )
     list_filter = ('active', 'created')
     search_fields = ('name', 'user__username')
-    inlines = (QuestionAdmin,)
+    readonly_fields = ('version', 'num_questions', 'max_marks')
+    inlines = (ExamAudienceAdmin, QuestionAdmin)
+
+    def save_formset(self, request, form, formset, change):
+        if formset.model is not Question:
+            return super().save_formset(request, form, formset, change)
+
+        # the same versioning as the question views: a new version for the
+        # changes, published questions are replaced or removed from it on,
+        # and the counters recounted along with it
+        formset.save(commit=False)
+        if not (
+            formset.new_objects or formset.changed_objects or formset.deleted_objects
+        ):
+            return
+        exam = form.instance
+        exam.bump_version()
+        for question in formset.new_objects:
+            question.version_added = exam.version
+            question.save()
+        for question, _ in formset.changed_objects:
+            if question.is_published():
+                question.save_revision(exam.version)
+            else:
+                question.save()
+        for question in formset.deleted_objects:
+            if question.is_published():
+                question.version_removed = exam.version
+                question.save(update_fields=['version_removed'])
+            else:
+                question.delete()
+        exam.update_question_counters()
 
 
 class AnswerAdmin(admin.StackedInline):
@@ -34,18 +75,48 @@ class SessionAdmin(admin.ModelAdmin):
         'exam',
         'user',
         'completed',
-        'get_marks',
-        'get_max_marks',
-        'get_num_attempted_que',
-        'get_num_total_que',
-        'get_passing_status',
+        'marks',
+        'max_marks',
+        'num_attempted',
+        'num_total',
+        'passed',
         'created',
         'submitted',
     )
-    list_filter = ('completed', 'created', 'submitted')
+    list_filter = ('completed', 'passed', 'created', 'submitted')
     search_fields = ('exam__name', 'user__username')
+    readonly_fields = ('marks', 'max_marks', 'num_attempted', 'num_total', 'passed')
     inlines = (AnswerAdmin,)
+    actions = ('regrade',)
+
+    @admin.action(description="Regrade selected completed sessions")
+    def regrade(self, request, queryset):
+        queryset.filter(completed=True).grade()
+
+
+class RegradeChangeAdmin(admin.TabularInline):
+    model = RegradeChange
+    extra = 0
+    raw_id_fields = ('session',)
+
+
+class RegradeAdmin(admin.ModelAdmin):
+    list_display = (
+        'question',
+        'user',
+        'correct_answer',
+        'marks_on_correct_answer',
+        'marks_on_wrong_answer',
+        'num_sessions',
+        'failed',
+        'created',
+        'finished',
+    )
+    list_filter = ('failed', 'created')
+    search_fields = ('question__question', 'question__exam__name', 'user__username')
+    inlines = (RegradeChangeAdmin,)
 
 
 admin.site.register(Exam, ExamAdmin)
 admin.site.register(Session, SessionAdmin)
+admin.site.register(Regrade, RegradeAdmin)
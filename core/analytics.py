@@ -0,0 +1,213 @@
+from itertools import chain
+import numpy as np
+from .cache import (
+    ANALYSIS_LOCK_TIMEOUT,
+    ANALYSIS_TIMEOUT,
+    exam_analysis_key,
+    get_or_compute,
+)
+from .models import ANSWER_CHOICES, Answer, Question
+
+OPTIONS = [option for option, _ in ANSWER_CHOICES]
+
+# items answered by more than this share of students are too easy, by less
+# than the other too hard
+EASY_DIFFICULTY = 0.9
+HARD_DIFFICULTY = 0.2
+
+
+def encode_answers(answers):
+    # "A".."D" -> 1..4, one byte per answer
+    return np.frombuffer("".join(answers).encode(), dtype=np.uint8) - ord("A") + 1
+
+
+class ResponseMatrix:
+    # completed sessions of an exam as dense session x item matrices. an item
+    # is a question together with its later revisions, so sessions on
+    # different exam versions line up.
+
+    def __init__(self, exam):
+        questions = list(
+            Question.objects.filter(exam=exam)
+            .order_by("created", "pk")
+            .values_list("pk", "origin_id", "correct_answer")
+        )
+        question_pks = np.array([pk for pk, _, _ in questions], dtype=np.int64)
+        order = np.argsort(question_pks)
+        self.question_pks = question_pks[order]
+        item_pks = [origin or pk for pk, origin, _ in questions]
+        # items in the order their first revision was created
+        self.item_pks = list(dict.fromkeys(item_pks))
+        item_index = {pk: col for col, pk in enumerate(self.item_pks)}
+        self.question_items = np.array(
+            [item_index[pk] for pk in item_pks], dtype=np.int64
+        )[order]
+        self.question_keys = encode_answers(
+            [answer for _, _, answer in questions]
+        )[order]
+
+        sessions = list(
+            exam.session_set.filter(completed=True)
+            .order_by("pk")
+            .values_list("pk", "question_ids")
+        )
+        self.session_pks = np.array([pk for pk, _ in sessions], dtype=np.int64)
+        num_sessions, num_items = len(sessions), len(self.item_pks)
+
+        # which items each session was given
+        lengths = np.array([len(ids) for _, ids in sessions], dtype=np.int64)
+        ids = np.fromiter(
+            chain.from_iterable(ids for _, ids in sessions),
+            dtype=np.int64,
+            count=lengths.sum(),
+        )
+        self.presented = np.zeros((num_sessions, num_items), dtype=bool)
+        self.presented[
+            np.repeat(np.arange(num_sessions), lengths), self.items_of(ids)
+        ] = True
+
+        # chosen option (0 when not answered) and correctness of every answer
+        answers = list(
+            Answer.objects.filter(
+                session__exam=exam, session__completed=True
+            ).values_list("session_id", "question_id", "answer")
+        )
+        session_ids, question_ids, options = zip(*answers) if answers else ((), (), ())
+        rows = np.searchsorted(self.session_pks, np.array(session_ids, dtype=np.int64))
+        question_ids = np.array(question_ids, dtype=np.int64)
+        cols = self.items_of(question_ids)
+        codes = encode_answers(options)
+        keys = self.question_keys[np.searchsorted(self.question_pks, question_ids)]
+
+        self.responses = np.zeros((num_sessions, num_items), dtype=np.uint8)
+        self.responses[rows, cols] = codes
+        self.correct = np.zeros((num_sessions, num_items), dtype=bool)
+        self.correct[rows, cols] = codes == keys
+
+    def items_of(self, question_ids):
+        return self.question_items[np.searchsorted(self.question_pks, question_ids)]
+
+
+def divide(a, b):
+    # elementwise a / b, nan where b is 0
+    return np.divide(
+        a, b, out=np.full(np.shape(a), np.nan), where=np.asarray(b) != 0
+    )
+
+
+def to_float(value):
+    return None if np.isnan(value) else round(float(value), 3)
+
+
+def analyze_items(matrix):
+    presented = matrix.presented.astype(np.float64)
+    correct = matrix.correct.astype(np.float64)
+    # number of correct answers of every session
+    totals = correct.sum(axis=1)
+
+    num_presented = presented.sum(axis=0)
+    num_correct = correct.sum(axis=0)
+    # difficulty (p-value): share of the students given the item who got it
+    # right
+    difficulty = divide(num_correct, num_presented)
+
+    # point-biserial correlation of each item with the total score, over the
+    # sessions which were given the item
+    mean_total = divide(presented.T @ totals, num_presented)
+    mean_total_correct = divide(correct.T @ totals, num_correct)
+    std_total = np.sqrt(
+        np.maximum(divide(presented.T @ totals ** 2, num_presented) - mean_total ** 2, 0)
+    )
+    discrimination = divide(mean_total_correct - mean_total, std_total) * np.sqrt(
+        divide(difficulty, 1 - difficulty)
+    )
+
+    # how often each option was chosen, and how often the item was skipped
+    option_counts = np.stack(
+        [
+            (matrix.responses == code).sum(axis=0)
+            for code in range(1, len(OPTIONS) + 1)
+        ],
+        axis=1,
+    )
+    omitted = num_presented - option_counts.sum(axis=1)
+
+    # kr-20 reliability of the exam, over the items given to anyone
+    num_items = np.count_nonzero(num_presented)
+    variance = totals.var()
+    item_variance = np.nansum(difficulty * (1 - difficulty))
+    if num_items > 1 and variance > 0:
+        kr20 = num_items / (num_items - 1) * (1 - item_variance / variance)
+    else:
+        kr20 = np.nan
+
+    return {
+        "num_presented": num_presented.astype(np.int64),
+        "difficulty": difficulty,
+        "discrimination": discrimination,
+        "option_counts": option_counts,
+        "omitted": omitted.astype(np.int64),
+        "kr20": kr20,
+    }
+
+
+def item_analysis_key(exam):
+    # cached until the next submission or regrade
+    return exam_analysis_key(exam.pk, "items", exam.get_results_state())
+
+
+def get_item_analysis(exam):
+    return get_or_compute(
+        item_analysis_key(exam),
+        lambda: build_item_analysis(exam),
+        ANALYSIS_TIMEOUT,
+        ANALYSIS_LOCK_TIMEOUT,
+    )
+
+
+def build_item_analysis(exam):
+    matrix = ResponseMatrix(exam)
+    stats = analyze_items(matrix)
+
+    # items are shown with their latest revision
+    questions = {}
+    for question in Question.objects.filter(exam=exam).order_by("version_added"):
+        questions[question.origin_id or question.pk] = question
+
+    items = []
+    for col, item_pk in enumerate(matrix.item_pks):
+        question = questions[item_pk]
+        difficulty = to_float(stats["difficulty"][col])
+        discrimination = to_float(stats["discrimination"][col])
+        options = dict(zip(OPTIONS, stats["option_counts"][col].tolist()))
+        flags = []
+        if difficulty is not None and difficulty > EASY_DIFFICULTY:
+            flags.append("Too easy")
+        if difficulty is not None and difficulty < HARD_DIFFICULTY:
+            flags.append("Too hard")
+        if discrimination is not None and discrimination < 0:
+            flags.append("Negative discrimination")
+        if any(
+            count > options[question.correct_answer]
+            for option, count in options.items()
+            if option != question.correct_answer
+        ):
+            flags.append("Misleading distractor")
+        items.append(
+            {
+                "question": question,
+                "removed": question.version_removed is not None,
+                "num_presented": int(stats["num_presented"][col]),
+                "difficulty": difficulty,
+                "discrimination": discrimination,
+                "options": options,
+                "omitted": int(stats["omitted"][col]),
+                "flags": flags,
+            }
+        )
+
+    return {
+        "num_sessions": len(matrix.session_pks),
+        "kr20": to_float(stats["kr20"]),
+        "items": items,
+    }
@@ -0,0 +1,132 @@
+import time
+import uuid
+from django.core.cache import cache
+from django.utils import timezone
+
+QUESTIONS_TIMEOUT = 60 * 60
+ANALYSIS_TIMEOUT = 60 * 60 * 24
+# bounds how long a change made around the models (a raw update) can go
+# unnoticed, the open exams are otherwise rebuilt on every change
+OPEN_EXAMS_TIMEOUT = 60 * 5
+OPEN_EXAMS_KEY = "core:open_exams"
+# how long a computation may hold its key before others compute as well, and
+# how often the others look for its result meanwhile
+LOCK_TIMEOUT = 30
+ANALYSIS_LOCK_TIMEOUT = 60 * 5
+LOCK_POLL_INTERVAL = 0.05
+
+
+def get_or_compute(key, compute, timeout, lock_timeout=LOCK_TIMEOUT):
+    # the cached value of key, computed on a miss by a single caller: the one
+    # that adds the lock computes while the others wait for its result,
+    # rather than every request sent at the same moment hitting the
+    # database. timeout may be a function of the computed value.
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    lock, token = f"{key}:lock", uuid.uuid4().hex
+    deadline = time.monotonic() + lock_timeout
+    while not cache.add(lock, token, lock_timeout):
+        time.sleep(LOCK_POLL_INTERVAL)
+        value = cache.get(key)
+        if value is not None:
+            return value
+        if time.monotonic() > deadline:
+            # the computation died or takes too long, do not wait forever
+            return compute()
+
+    try:
+        value = compute()
+        cache.set(key, value, timeout(value) if callable(timeout) else timeout)
+    finally:
+        # a computation that outlived its lock must not release the lock of
+        # the caller that took it over
+        if cache.get(lock) == token:
+            cache.delete(lock)
+    return value
+
+
+def timestamp(value):
+    return value.timestamp() if value else 0
+
+
+# a regrade fixes the questions of published versions in place, the time of
+# the last one (Exam.regraded) is part of the key so that every process
+# misses once it is committed
+def exam_questions_key(exam_pk, version, regraded):
+    return f"core:exam:{exam_pk}:v{version}:{timestamp(regraded)}:questions"
+
+
+# questions of an exam version keyed by pk, in creation order. versions are
+# otherwise immutable, but the entries are shared by every session of the
+# version and must not be mutated.
+def get_exam_questions(exam_pk, version, regraded, queryset):
+    return get_or_compute(
+        exam_questions_key(exam_pk, version, regraded),
+        lambda: {q.pk: q for q in queryset},
+        QUESTIONS_TIMEOUT,
+    )
+
+
+def exam_payloads_key(exam_pk, version, regraded):
+    return f"core:exam:{exam_pk}:v{version}:{timestamp(regraded)}:payloads"
+
+
+# the payloads sent to students for the questions of an exam version, keyed
+# by question pk
+def get_exam_payloads(exam_pk, version, regraded, get_questions):
+    return get_or_compute(
+        exam_payloads_key(exam_pk, version, regraded),
+        lambda: {pk: q.get_payload() for pk, q in get_questions().items()},
+        QUESTIONS_TIMEOUT,
+    )
+
+
+def clear_exam_questions(exam_pk, versions, regraded):
+    # the entries of a generation no longer in use, which would otherwise
+    # stay until they expire
+    cache.delete_many(
+        [exam_questions_key(exam_pk, version, regraded) for version in versions]
+        + [exam_payloads_key(exam_pk, version, regraded) for version in versions]
+    )
+
+
+def get_or_schedule(key, schedule, lock_timeout=ANALYSIS_LOCK_TIMEOUT):
+    # the cached value of key, or None after schedule() started computing it
+    # in the background. it is scheduled once, again only if no value came
+    # of it within lock_timeout.
+    value = cache.get(key)
+    if value is None and cache.add(f"{key}:scheduled", 1, lock_timeout):
+        schedule()
+    return value
+
+
+# analyses are computed from the completed sessions, a new submission or a
+# regrade changes the state and so the key
+def exam_analysis_key(exam_pk, name, state):
+    submitted = timestamp(state["last_submitted"])
+    regraded = timestamp(state["last_regraded"])
+    return f"core:exam:{exam_pk}:{name}:{state['num_sessions']}:{submitted}:{regraded}"
+
+
+# the open exams only change when an exam starts or ends, or is changed. the
+# entry expires (to the second) when the next exam starts or ends.
+# build(now) returns the exams and that time (None if there is none).
+def get_open_exams(build):
+    def compute():
+        now = timezone.now()
+        exams, until = build(now)
+        return {"exams": exams, "now": now, "until": until}
+
+    def timeout(entry):
+        if entry["until"] is None:
+            return OPEN_EXAMS_TIMEOUT
+        seconds = (entry["until"] - entry["now"]).total_seconds()
+        return max(min(OPEN_EXAMS_TIMEOUT, seconds), 1)
+
+    return get_or_compute(OPEN_EXAMS_KEY, compute, timeout)["exams"]
+
+
+def clear_open_exams():
+    cache.delete(OPEN_EXAMS_KEY)
@@ -0,0 +1,151 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from .analytics import OPTIONS, ResponseMatrix, divide
+from .cache import (
+    ANALYSIS_LOCK_TIMEOUT,
+    ANALYSIS_TIMEOUT,
+    exam_analysis_key,
+    get_or_compute,
+)
+from .models import Session
+
+# rows of the pair matrix computed at a time
+BLOCK_SIZE = 512
+# cohorts from this size on are split across a process pool
+POOL_MIN_SESSIONS = 2000
+# a pair is reported when it shares at least this many wrong answers and
+# that is this many standard deviations above chance
+MIN_SHARED_WRONG = 3
+MIN_Z_SCORE = 3.0
+REPORT_SIZE = 100
+
+
+class PairScorer:
+    # pairwise comparison of sessions' answer vectors. a pair's score is how
+    # far the number of identical wrong answers is above what two students
+    # answering independently would share, given how popular each wrong
+    # option was.
+
+    def __init__(self, matrix):
+        responses, correct = matrix.responses, matrix.correct
+        # one-hot answers (session x option x item), split in right and wrong.
+        # kept as a byte per cell and only converted a block at a time
+        options = np.arange(1, len(OPTIONS) + 1, dtype=np.uint8)
+        chosen = responses[:, None, :] == options[None, :, None]
+        self.same = chosen.reshape(len(responses), -1).view(np.uint8)
+        wrong = chosen & ~correct[:, None, :]
+        self.wrong = wrong.reshape(len(responses), -1).view(np.uint8)
+        self.presented = matrix.presented.view(np.uint8)
+
+        # chance that two students given an item pick the same wrong option
+        shares = divide(wrong.sum(axis=0), matrix.presented.sum(axis=0)[None, :])
+        self.chance = np.nan_to_num((shares ** 2).sum(axis=0)).astype(np.float32)
+
+    def product(self, rows, other):
+        # rows @ other.T, the byte matrix other converted to float32 (for
+        # blas, counts are exact) a block of sessions at a time
+        rows = rows.astype(np.float32)
+        result = np.empty((len(rows), len(other)), dtype=np.float32)
+        for start in range(0, len(other), BLOCK_SIZE):
+            block = other[start : start + BLOCK_SIZE].astype(np.float32)
+            result[:, start : start + BLOCK_SIZE] = rows @ block.T
+        return result
+
+    def score_block(self, start, stop):
+        # pairs (i, j) with start <= i < stop and i < j
+        rows = slice(start, stop)
+        shared_wrong = self.product(self.wrong[rows], self.wrong)
+        shared_same = self.product(self.same[rows], self.same)
+        presented = self.presented[rows] * self.chance
+        expected = self.product(presented, self.presented)
+        variance = self.product(presented * (1 - self.chance), self.presented)
+        z_scores = divide(shared_wrong - expected, np.sqrt(variance))
+
+        i, j = np.nonzero(
+            (shared_wrong >= MIN_SHARED_WRONG)
+            & (np.nan_to_num(z_scores) >= MIN_Z_SCORE)
+            & (np.arange(start, stop)[:, None] < np.arange(len(self.wrong))[None, :])
+        )
+        z = z_scores[i, j]
+        top = np.argsort(-z)[:REPORT_SIZE]
+        i, j = i[top], j[top]
+        return (
+            i + start,
+            j,
+            shared_wrong[i, j].astype(np.int64),
+            shared_same[i, j].astype(np.int64),
+            z[top],
+        )
+
+
+_scorer = None
+
+
+def _init_worker(scorer):
+    global _scorer
+    _scorer = scorer
+
+
+def _score_block(bounds):
+    return _scorer.score_block(*bounds)
+
+
+def score_pairs(matrix):
+    scorer = PairScorer(matrix)
+    num_sessions = len(matrix.session_pks)
+    blocks = [
+        (start, min(start + BLOCK_SIZE, num_sessions))
+        for start in range(0, num_sessions, BLOCK_SIZE)
+    ]
+
+    # celery's prefork workers are daemonic and can not start processes
+    if num_sessions >= POOL_MIN_SESSIONS and not multiprocessing.current_process().daemon:
+        with ProcessPoolExecutor(initializer=_init_worker, initargs=(scorer,)) as pool:
+            results = list(pool.map(_score_block, blocks))
+    else:
+        results = [scorer.score_block(*bounds) for bounds in blocks]
+
+    if not results:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty, empty, np.empty(0)
+    i, j, shared_wrong, shared_same, z = (np.concatenate(r) for r in zip(*results))
+    top = np.argsort(-z)[:REPORT_SIZE]
+    return i[top], j[top], shared_wrong[top], shared_same[top], z[top]
+
+
+def collusion_report_key(exam):
+    # cached until the next submission or regrade
+    return exam_analysis_key(exam.pk, "collusion", exam.get_results_state())
+
+
+def get_collusion_report(exam):
+    return get_or_compute(
+        collusion_report_key(exam),
+        lambda: build_collusion_report(exam),
+        ANALYSIS_TIMEOUT,
+        ANALYSIS_LOCK_TIMEOUT,
+    )
+
+
+def build_collusion_report(exam):
+    matrix = ResponseMatrix(exam)
+    i, j, shared_wrong, shared_same, z = score_pairs(matrix)
+
+    first = matrix.session_pks[i].tolist()
+    second = matrix.session_pks[j].tolist()
+    sessions = Session.objects.select_related("student").in_bulk(first + second)
+    pairs = []
+    for a, b, wrong, same, score in zip(
+        first, second, shared_wrong.tolist(), shared_same.tolist(), z.tolist()
+    ):
+        pairs.append(
+            {
+                "sessions": (sessions[a], sessions[b]),
+                "shared_wrong": wrong,
+                "shared_answers": same,
+                "z_score": round(score, 2),
+            }
+        )
+
+    return {"num_sessions": len(matrix.session_pks), "pairs": pairs}
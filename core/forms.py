@@ -1,8 +1,26 @@
+from itertools import product
 from django import forms
-from .models import Exam, Question
+from users.models import BRANCH_CHOICES, COLLEGE_CHOICES, STANDARD_CHOICES
+from .models import Exam, Question, Regrade
 
 
 class ExamForm(forms.ModelForm):
+    # the audience is every combination of the selected colleges, standards
+    # and branches
+    colleges = forms.MultipleChoiceField(
+        choices=COLLEGE_CHOICES, widget=forms.CheckboxSelectMultiple
+    )
+    standards = forms.MultipleChoiceField(
+        choices=STANDARD_CHOICES,
+        widget=forms.CheckboxSelectMultiple,
+        initial=[value for value, _ in STANDARD_CHOICES],
+    )
+    branches = forms.MultipleChoiceField(
+        choices=BRANCH_CHOICES,
+        widget=forms.CheckboxSelectMultiple,
+        help_text="Only students of the selected colleges, standards and branches can take the exam.",
+    )
+
     class Meta:
         model = Exam
         fields = [
@@ -23,6 +41,34 @@ class ExamForm(forms.ModelForm):
             "end_time": forms.DateTimeInput(attrs={"type": "datetime-local"}),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            audience = self.instance.get_audience()
+            for i, name in enumerate(("colleges", "standards", "branches")):
+                self.initial.setdefault(name, sorted({key[i] for key in audience}))
+
+    def save(self, commit=True):
+        instance = super().save(commit)
+        if commit:
+            self.save_audience()
+        else:
+            # saved along with the other many-to-many data once the exam is
+            save_m2m = self.save_m2m
+
+            def save_m2m_and_audience():
+                save_m2m()
+                self.save_audience()
+
+            self.save_m2m = save_m2m_and_audience
+        return instance
+
+    def save_audience(self):
+        data = self.cleaned_data
+        self.instance.set_audience(
+            product(data["colleges"], data["standards"], data["branches"])
+        )
+
 
 class QuestionForm(forms.ModelForm):
     class Meta:
@@ -39,3 +85,29 @@ class QuestionForm(forms.ModelForm):
             "marks_on_wrong_answer",
         ]
         widgets = {"question": forms.Textarea(attrs={"rows": 5})}
+
+
+class RegradeForm(forms.ModelForm):
+    class Meta:
+        model = Regrade
+        fields = [
+            "correct_answer",
+            "marks_on_correct_answer",
+            "marks_on_wrong_answer",
+        ]
+
+
+class QuestionImportForm(forms.Form):
+    file = forms.FileField(
+        help_text="CSV or XLSX with the columns question, image, correct_answer, "
+        "option_A, option_B, option_C, option_D, marks_on_correct_answer and "
+        "marks_on_wrong_answer (0 when blank), or a ZIP with such a file and the "
+        "images it names in the image column.",
+        widget=forms.ClearableFileInput(attrs={"accept": ".csv,.xlsx,.zip"}),
+    )
+
+
+class QuestionRowForm(QuestionForm):
+    # a row of an import, the image is checked separately
+    class Meta(QuestionForm.Meta):
+        fields = [field for field in QuestionForm.Meta.fields if field != "image"]
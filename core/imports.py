@@ -0,0 +1,209 @@
+import csv
+import io
+import os
+import zipfile
+import openpyxl
+from concurrent.futures import ThreadPoolExecutor
+from django import forms
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction
+from .forms import QuestionForm, QuestionRowForm
+from .models import Question
+
+TABLE_EXTENSIONS = (".csv", ".xlsx")
+IMAGE_WORKERS = 8
+# limits of a zip upload, checked against the sizes it declares before
+# anything is extracted (reading a member stops at its declared size)
+MAX_ZIP_ENTRIES = 1000
+MAX_ZIP_SIZE = 100 * 1024 * 1024
+# columns a blank cell takes the model default of. a blank answer key or
+# mark is a mistake in the file and an error of the row, a blank penalty
+# means no penalty.
+DEFAULT_COLUMNS = ("marks_on_wrong_answer",)
+
+
+class ImportFileError(Exception):
+    pass
+
+
+def get_row_errors(form):
+    return [
+        f"{field}: {message}" if field != "__all__" else message
+        for field, messages in form.errors.items()
+        for message in messages
+    ]
+
+
+def read_csv(data):
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ImportFileError("CSV files must be UTF-8 encoded.")
+    return list(csv.reader(io.StringIO(text)))
+
+
+def read_xlsx(data):
+    try:
+        workbook = openpyxl.load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    except Exception:
+        raise ImportFileError("Not a valid Excel file.")
+    rows = [
+        ["" if value is None else str(value) for value in row]
+        for row in workbook.active.iter_rows(values_only=True)
+    ]
+    workbook.close()
+    return rows
+
+
+def read_table(name, data):
+    # rows of a csv or xlsx file as dicts keyed by the lower-cased header,
+    # each with its line number in the file. blank rows are skipped.
+    if name.lower().endswith(".csv"):
+        rows = read_csv(data)
+    elif name.lower().endswith(".xlsx"):
+        rows = read_xlsx(data)
+    else:
+        raise ImportFileError("Upload a CSV or XLSX file.")
+    if not rows:
+        raise ImportFileError("The file is empty.")
+
+    header = [column.strip().lower() for column in rows[0]]
+    table = []
+    for line, row in enumerate(rows[1:], start=2):
+        if any(value.strip() for value in row):
+            table.append((line, dict(zip(header, (value.strip() for value in row)))))
+    return table
+
+
+def read_upload(upload):
+    # the table of a csv or xlsx upload, or of the table file in a zip upload
+    # along with the other files of the zip by name
+    data = upload.read()
+    if upload.name.lower().endswith(TABLE_EXTENSIONS):
+        return read_table(upload.name, data), {}
+    if not upload.name.lower().endswith(".zip"):
+        raise ImportFileError("Upload a CSV, XLSX or ZIP file.")
+
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(data))
+    except zipfile.BadZipFile:
+        raise ImportFileError("Not a valid ZIP file.")
+    with archive:
+        infos = [
+            info
+            for info in archive.infolist()
+            if not info.is_dir() and not info.filename.startswith("__MACOSX/")
+        ]
+        if len(infos) > MAX_ZIP_ENTRIES:
+            raise ImportFileError(
+                f"The ZIP file can contain at most {MAX_ZIP_ENTRIES} files."
+            )
+        if sum(info.file_size for info in infos) > MAX_ZIP_SIZE:
+            raise ImportFileError(
+                f"The ZIP file can hold at most {MAX_ZIP_SIZE // (1024 * 1024)} MB "
+                "once extracted."
+            )
+        names = [info.filename for info in infos]
+        tables = [name for name in names if name.lower().endswith(TABLE_EXTENSIONS)]
+        if len(tables) != 1:
+            raise ImportFileError("The ZIP file must contain exactly one CSV or XLSX file.")
+        try:
+            files = {
+                os.path.basename(name): archive.read(name)
+                for name in names
+                if name != tables[0]
+            }
+            data = archive.read(tables[0])
+        except zipfile.BadZipFile:
+            # a member larger than it declares fails its crc check
+            raise ImportFileError("Not a valid ZIP file.")
+        return read_table(tables[0], data), files
+
+
+def check_image(item):
+    name, data = item
+    try:
+        forms.ImageField().clean(SimpleUploadedFile(name, data))
+    except ValidationError as e:
+        return e.messages[0]
+
+
+def save_image(item):
+    name, data = item
+    field = Question._meta.get_field("image")
+    return default_storage.save(field.generate_filename(None, name), ContentFile(data))
+
+
+def import_questions(exam, upload):
+    # validates every row and either creates all questions in one version of
+    # the exam or none, returns the created questions or the errors per line
+    table, files = read_upload(upload)
+    if not table:
+        raise ImportFileError("The file has no questions.")
+
+    columns = {field.lower(): field for field in QuestionForm.Meta.fields}
+    defaults = {
+        field: Question._meta.get_field(field).default for field in DEFAULT_COLUMNS
+    }
+    image_names = sorted({row.get("image") for _, row in table} - {None, ""})
+
+    # pillow checks the images while the rows are validated
+    with ThreadPoolExecutor(IMAGE_WORKERS) as pool:
+        checks = {
+            name: pool.submit(check_image, (name, files[name]))
+            for name in image_names
+            if name in files
+        }
+
+        errors, questions, images = {}, [], []
+        for line, row in table:
+            data = {columns[key]: value for key, value in row.items() if key in columns}
+            for field, default in defaults.items():
+                if not data.get(field):
+                    data[field] = default
+            form = QuestionRowForm(data)
+            row_errors = get_row_errors(form)
+            image = data.get("image")
+            if image and image not in files:
+                row_errors.append(f"image: {image} was not found in the uploaded ZIP file.")
+            elif image:
+                images.append((line, image))
+            if row_errors:
+                errors[line] = row_errors
+            else:
+                question = form.save(commit=False)
+                question.exam = exam
+                question.image = image or None
+                questions.append(question)
+
+        for line, image in images:
+            error = checks[image].result()
+            if error:
+                errors.setdefault(line, []).append(f"image: {error}")
+        if errors:
+            return [], sorted(errors.items())
+
+        stored = dict(
+            zip(image_names, pool.map(save_image, ((name, files[name]) for name in image_names)))
+        )
+
+    for question in questions:
+        if question.image:
+            question.image = stored[question.image.name]
+    try:
+        with transaction.atomic():
+            exam.bump_version()
+            for question in questions:
+                question.version_added = exam.version
+            Question.objects.bulk_create(questions)
+            exam.update_question_counters()
+    except Exception:
+        # no question refers to the stored images
+        for name in stored.values():
+            default_storage.delete(name)
+        raise
+
+    return questions, []
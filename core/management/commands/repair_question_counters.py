@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from core.models import Exam
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = "Rebuild the question count and max marks counters of exams."
+
+    def add_arguments(self, parser):
+        parser.add_argument("exam_ids", nargs="*", type=int, help="Only these exams.")
+
+    def handle(self, *args, **options):
+        exams = Exam.objects.order_by("pk")
+        if options["exam_ids"]:
+            exams = exams.filter(pk__in=options["exam_ids"])
+
+        # one short update per batch of exams instead of locking every row
+        pks = list(exams.values_list("pk", flat=True))
+        for start in range(0, len(pks), BATCH_SIZE):
+            Exam.objects.filter(pk__in=pks[start : start + BATCH_SIZE]).update_question_counters()
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt question counters of {len(pks)} exams."))
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.5 on 2026-10-18 07:48
+
+import django.contrib.postgres.fields
+import random
+from django.db import migrations, models
+
+
+def populate_question_ids(apps, schema_editor):
+    Question = apps.get_model("core", "Question")
+    Session = apps.get_model("core", "Session")
+
+    # rebuild the order get_questions() used to compute on every request
+    for session in Session.objects.iterator():
+        questions = Question.objects.filter(
+            exam_id=session.exam_id, created__lt=session.created
+        ).order_by("created")
+        question_ids = [
+            q.pk for q in questions if not q.deleted or q.deleted > session.created
+        ]
+        random.Random(session.seed).shuffle(question_ids)
+        session.question_ids = question_ids
+        session.save(update_fields=["question_ids"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_question_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='question_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), default=list, size=None),
+        ),
+        migrations.RunPython(populate_question_ids, migrations.RunPython.noop),
+    ]
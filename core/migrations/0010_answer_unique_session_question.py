@@ -0,0 +1,34 @@
+# Generated by Django 3.2.5 on 2026-10-18 07:50
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def delete_duplicate_answers(apps, schema_editor):
+    Answer = apps.get_model("core", "Answer")
+
+    # keep the most recently written answer of each duplicate pair
+    duplicates = (
+        Answer.objects.values("session", "question")
+        .annotate(keep=Max("pk"), count=models.Count("pk"))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates:
+        Answer.objects.filter(
+            session=duplicate["session"], question=duplicate["question"]
+        ).exclude(pk=duplicate["keep"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_session_question_ids'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_answers, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='answer',
+            constraint=models.UniqueConstraint(fields=('session', 'question'), name='unique_session_question'),
+        ),
+    ]
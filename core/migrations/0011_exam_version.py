@@ -0,0 +1,18 @@
+# Generated by Django 3.2.5 on 2026-10-18 07:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_answer_unique_session_question'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exam',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.2.5 on 2026-10-18 08:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_exam_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='version_added',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='version_removed',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='origin',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.question'),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='exam_version',
+            field=models.PositiveIntegerField(default=1),
+            preserve_default=False,
+        ),
+    ]
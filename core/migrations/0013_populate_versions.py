@@ -0,0 +1,44 @@
+# Generated by Django 3.2.5 on 2026-10-18 08:20
+
+from django.db import migrations
+
+
+def populate_versions(apps, schema_editor):
+    Exam = apps.get_model("core", "Exam")
+    Question = apps.get_model("core", "Question")
+    Session = apps.get_model("core", "Session")
+
+    # every distinct soft delete time of an exam becomes a version, sessions
+    # pin the version that was current when they were created
+    for exam in Exam.objects.iterator():
+        base = exam.version
+        deletions = sorted(
+            set(
+                Question.objects.filter(exam=exam)
+                .exclude(deleted=None)
+                .values_list("deleted", flat=True)
+            )
+        )
+        Question.objects.filter(exam=exam).update(version_added=base)
+        Session.objects.filter(exam=exam).update(exam_version=base)
+        for i, deleted in enumerate(deletions, start=1):
+            Question.objects.filter(exam=exam, deleted=deleted).update(
+                version_removed=base + i
+            )
+            Session.objects.filter(exam=exam, created__gte=deleted).update(
+                exam_version=base + i
+            )
+
+        exam.version = base + len(deletions)
+        exam.save(update_fields=["version"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_exam_versions'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_versions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.5 on 2026-10-18 08:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_populate_versions'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='question',
+            name='deleted',
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['exam', 'version_added', 'version_removed'], name='core_questi_exam_id_3792f2_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 3.2.5 on 2026-10-18 08:45
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Least
+
+
+def populate_deadline(apps, schema_editor):
+    Exam = apps.get_model("core", "Exam")
+    Session = apps.get_model("core", "Session")
+
+    # fire the foreign key triggers now so the column can be altered below
+    schema_editor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+    duration = Exam.objects.filter(pk=OuterRef("exam_id")).values("duration")
+    Session.objects.update(
+        deadline=Least(F("created") + Subquery(duration), F("end_time"))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_remove_question_deleted'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='deadline',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(populate_deadline, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='session',
+            name='deadline',
+            field=models.DateTimeField(),
+        ),
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(fields=['completed', 'deadline'], name='core_sessio_complet_60d798_idx'),
+        ),
+    ]
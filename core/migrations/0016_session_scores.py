@@ -0,0 +1,89 @@
+# Generated by Django 3.2.5 on 2026-10-18 10:12
+
+from django.db import migrations, models
+from django.db.models import Case, Count, F, Func, OuterRef, Q, Subquery, Sum, When
+from django.db.models.functions import Coalesce
+
+
+def grade_completed_sessions(apps, schema_editor):
+    Answer = apps.get_model("core", "Answer")
+    Exam = apps.get_model("core", "Exam")
+    Question = apps.get_model("core", "Question")
+    Session = apps.get_model("core", "Session")
+
+    answers = Answer.objects.filter(session=OuterRef("pk")).values("session")
+    marks = answers.annotate(
+        marks=Sum(
+            Case(
+                When(
+                    answer=F("question__correct_answer"),
+                    then=F("question__marks_on_correct_answer"),
+                ),
+                default=F("question__marks_on_wrong_answer"),
+            )
+        )
+    ).values("marks")
+    attempted = answers.annotate(count=Count("pk")).values("count")
+    max_marks = (
+        Question.objects.filter(pk=Func(OuterRef("question_ids"), function="ANY"))
+        .values("exam")
+        .annotate(marks=Sum("marks_on_correct_answer"))
+        .values("marks")
+    )
+    passing_percentage = Exam.objects.filter(pk=OuterRef("exam_id")).values(
+        "passing_percentage"
+    )
+
+    sessions = Session.objects.filter(completed=True)
+    sessions.update(
+        marks=Coalesce(Subquery(marks), 0.0),
+        max_marks=Coalesce(Subquery(max_marks), 0.0),
+        num_attempted=Coalesce(Subquery(attempted), 0),
+        num_total=Func(
+            F("question_ids"),
+            function="cardinality",
+            output_field=models.IntegerField(),
+        ),
+    )
+    sessions.update(
+        passed=models.ExpressionWrapper(
+            Q(marks__gte=F("max_marks") * Subquery(passing_percentage) / 100),
+            output_field=models.BooleanField(),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_session_deadline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='marks',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='max_marks',
+            field=models.FloatField(blank=True, null=True, verbose_name='max marks'),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='num_attempted',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='no. of attempted questions'),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='num_total',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='no. of questions'),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='passed',
+            field=models.BooleanField(blank=True, null=True, verbose_name='pass'),
+        ),
+        migrations.RunPython(grade_completed_sessions, migrations.RunPython.noop),
+    ]
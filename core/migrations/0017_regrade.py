@@ -0,0 +1,58 @@
+# Generated by Django 3.2.5 on 2026-10-18 08:08
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0016_session_scores'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Regrade',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('correct_answer', models.CharField(choices=[('A', 'A'), ('B', 'B'), ('C', 'C'), ('D', 'D')], max_length=1)),
+                ('marks_on_correct_answer', models.FloatField()),
+                ('marks_on_wrong_answer', models.FloatField()),
+                ('num_sessions', models.PositiveIntegerField(blank=True, null=True)),
+                ('finished', models.DateTimeField(blank=True, null=True)),
+                ('failed', models.BooleanField(default=False)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.question')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ('-created',),
+            },
+        ),
+        migrations.AddField(
+            model_name='exam',
+            name='regraded',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='RegradeChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('marks_before', models.FloatField(blank=True, null=True)),
+                ('marks_after', models.FloatField(blank=True, null=True)),
+                ('passed_before', models.BooleanField(blank=True, null=True)),
+                ('passed_after', models.BooleanField(blank=True, null=True)),
+                ('regrade', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes', to='core.regrade')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.session')),
+            ],
+            options={
+                'ordering': ('session',),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='regradechange',
+            constraint=models.UniqueConstraint(fields=('regrade', 'session'), name='unique_regrade_session'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.5 on 2026-10-18 08:10
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_regrade'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='question',
+            options={'ordering': ('created', 'pk')},
+        ),
+    ]
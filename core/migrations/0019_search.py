@@ -0,0 +1,76 @@
+# Generated by Django 3.2.5 on 2026-10-18 08:13
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# the search columns are computed by the database on every insert and on
+# updates of the indexed columns, so bulk_create and update() keep them
+# current too. the configuration must match core.search.SEARCH_CONFIG.
+CREATE_TRIGGERS = """
+CREATE FUNCTION core_exam_search_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search := to_tsvector('english', coalesce(NEW.name, ''));
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_exam_search_update
+    BEFORE INSERT OR UPDATE OF name, search ON core_exam
+    FOR EACH ROW EXECUTE PROCEDURE core_exam_search_update();
+
+CREATE FUNCTION core_question_search_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search :=
+        setweight(to_tsvector('english', coalesce(NEW.question, '')), 'A') ||
+        setweight(to_tsvector('english', concat_ws(' ',
+            NEW."option_A", NEW."option_B", NEW."option_C", NEW."option_D"
+        )), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_question_search_update
+    BEFORE INSERT OR UPDATE OF question, "option_A", "option_B", "option_C", "option_D", search
+    ON core_question
+    FOR EACH ROW EXECUTE PROCEDURE core_question_search_update();
+
+UPDATE core_exam SET search = NULL;
+UPDATE core_question SET search = NULL;
+"""
+
+DROP_TRIGGERS = """
+DROP TRIGGER core_question_search_update ON core_question;
+DROP FUNCTION core_question_search_update();
+DROP TRIGGER core_exam_search_update ON core_exam;
+DROP FUNCTION core_exam_search_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_question_ordering'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exam',
+            name='search',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='search',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='exam',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search'], name='core_exam_search_fe4f12_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search'], name='core_questi_search_754bc7_gin'),
+        ),
+        migrations.RunSQL(CREATE_TRIGGERS, DROP_TRIGGERS),
+    ]
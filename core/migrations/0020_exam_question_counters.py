@@ -0,0 +1,48 @@
+# Generated by Django 3.2.5 on 2026-10-18 08:19
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def count_questions(apps, schema_editor):
+    Exam = apps.get_model("core", "Exam")
+    Question = apps.get_model("core", "Question")
+
+    questions = (
+        Question.objects.filter(exam=OuterRef("pk"), version_removed=None)
+        .order_by()
+        .values("exam")
+    )
+    Exam.objects.update(
+        num_questions=Coalesce(
+            Subquery(questions.annotate(count=Count("pk")).values("count")), 0
+        ),
+        max_marks=Coalesce(
+            Subquery(
+                questions.annotate(marks=Sum("marks_on_correct_answer")).values("marks")
+            ),
+            0.0,
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exam',
+            name='max_marks',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='exam',
+            name='num_questions',
+            field=models.PositiveIntegerField(default=0, verbose_name='no. of questions'),
+        ),
+        migrations.RunPython(count_questions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 3.2.5 on 2026-10-18 08:20
+
+from itertools import product
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def open_to_everyone(apps, schema_editor):
+    # existing exams stay open to every student, as they were
+    Exam = apps.get_model("core", "Exam")
+    ExamAudience = apps.get_model("core", "ExamAudience")
+
+    audience = list(
+        product(
+            *(
+                [value for value, _ in ExamAudience._meta.get_field(name).choices]
+                for name in ("college", "standard", "branch")
+            )
+        )
+    )
+    ExamAudience.objects.bulk_create(
+        (
+            ExamAudience(exam_id=pk, college=college, standard=standard, branch=branch)
+            for pk in Exam.objects.values_list("pk", flat=True).iterator()
+            for college, standard, branch in audience
+        ),
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_exam_question_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExamAudience',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('college', models.CharField(choices=[('SITRC', 'Sandip Institute Of Technology And Research Centre'), ('SIEM', 'Sandip Institute Of Engineering And Management'), ('SU', 'Sandip University')], max_length=5)),
+                ('standard', models.CharField(choices=[('FE', 'FE'), ('SE', 'SE'), ('TE', 'TE'), ('BE', 'BE')], max_length=2)),
+                ('branch', models.CharField(choices=[('CIVIL', 'Civil Engineering'), ('COMP', 'Computer Engineering'), ('EL', 'Electrical Engineering'), ('ENTC', 'Electronics and Telecommunication Engineering'), ('IT', 'Information Technology'), ('ME', 'Mechanical Engineering'), ('AI&DS', 'Artificial Intelligence & Data Science'), ('AR', 'Automation & Robotics')], max_length=5)),
+                ('exam', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='audiences', to='core.exam')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='examaudience',
+            constraint=models.UniqueConstraint(fields=('college', 'standard', 'branch', 'exam'), name='unique_exam_audience'),
+        ),
+        migrations.RunPython(open_to_everyone, migrations.RunPython.noop),
+    ]
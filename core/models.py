@@ -1,10 +1,14 @@
-import random
 from datetime import timedelta
-from django.contrib import admin
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.exceptions import ValidationError
-from django.db import models
-from users.models import Student
+from django.db import connections, models, transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from users.models import BRANCH_CHOICES, COLLEGE_CHOICES, STANDARD_CHOICES, Student
+from .cache import clear_open_exams, get_exam_payloads, get_exam_questions, get_open_exams
 
 User = get_user_model()
 
@@ -20,6 +24,15 @@ ANSWER_CHOICES = [
     (D, D),
 ]
 
+# how late the final sync sent along with an exam submission is accepted, the
+# timer submits the exam right at the deadline. expired sessions are only
+# finalized by the background task after it.
+SYNC_GRACE_PERIOD = timedelta(seconds=15)
+
+
+class ArrayAny(models.Func):
+    function = "ANY"
+
 
 def validate_max_duration(value):
     if value > timedelta(hours=23, minutes=59, seconds=59):
@@ -33,6 +46,38 @@ def validate_min_duration(value):
         raise ValidationError("Minimum duration is 1 second.")
 
 
+class ExamQuerySet(models.QuerySet):
+    def update_question_counters(self):
+        # recount the current questions of the exams in one update
+        questions = (
+            Question.objects.current()
+            .filter(exam=models.OuterRef("pk"))
+            .order_by()
+            .values("exam")
+        )
+        num_questions = questions.annotate(count=models.Count("pk")).values("count")
+        max_marks = questions.annotate(
+            marks=models.Sum("marks_on_correct_answer")
+        ).values("marks")
+        updated = self.update(
+            num_questions=Coalesce(models.Subquery(num_questions), 0),
+            max_marks=Coalesce(models.Subquery(max_marks), 0.0),
+        )
+        transaction.on_commit(clear_open_exams)
+        return updated
+
+    def open(self, now):
+        return self.filter(num_questions__gt=0, start_time__lte=now, end_time__gte=now)
+
+    def for_student(self, student):
+        # exams whose audience includes the student, one row per exam
+        return self.filter(
+            audiences__college=student.college,
+            audiences__standard=student.standard,
+            audiences__branch=student.branch,
+        )
+
+
 class Exam(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -46,23 +91,142 @@ class Exam(models.Model):
     start_time = models.DateTimeField()
     end_time = models.DateTimeField()
     show_result = models.BooleanField()
+    # current version of the question set, every question create, edit or
+    # delete starts a new one. sessions pin the version they started on.
+    version = models.PositiveIntegerField(default=1)
+    # time of the last regrade of the completed sessions
+    regraded = models.DateTimeField(null=True, blank=True)
+    # name as a text search document, kept up to date by a database trigger
+    search = SearchVectorField(null=True, editable=False)
+    # counters of the current questions, updated along with every change to
+    # the questions. manage.py repair_question_counters rebuilds them.
+    num_questions = models.PositiveIntegerField("no. of questions", default=0)
+    max_marks = models.FloatField(default=0)
+
+    objects = ExamQuerySet.as_manager()
 
     class Meta:
         ordering = ("-created",)
+        indexes = [GinIndex(fields=["search"])]
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        transaction.on_commit(clear_open_exams)
+
+    def delete(self, *args, **kwargs):
+        deleted = super().delete(*args, **kwargs)
+        transaction.on_commit(clear_open_exams)
+        return deleted
+
+    def get_results_state(self):
+        # sessions are only ever added to the results and only a regrade
+        # changes their scores, so the same count, latest submission and
+        # regrade time means the results did not change
+        state = self.session_set.filter(completed=True).aggregate(
+            num_sessions=models.Count("pk"),
+            last_submitted=models.Max("submitted"),
+        )
+        state["last_regraded"] = self.regraded
+        return state
+
+    def bump_version(self):
+        # in the transaction changing the questions, before is_published() is
+        # asked. the exam row stays locked until it commits, and sessions are
+        # started under the same lock, so a session either exists by then or
+        # is started on the new version
+        Exam.objects.select_for_update().only("pk").get(pk=self.pk)
+        Exam.objects.filter(pk=self.pk).update(version=models.F("version") + 1)
+        self.refresh_from_db(fields=["version"])
+
+    def update_question_counters(self):
+        # in the transaction that changed the questions, after the change
+        Exam.objects.filter(pk=self.pk).update_question_counters()
+        self.refresh_from_db(fields=["num_questions", "max_marks"])
+
+    def warm_cache(self):
+        # the questions and payloads of the current version, which sessions
+        # started now will use
+        get_version_payloads(self.pk, self.version, self.regraded)
+
+    def is_eligible(self, student):
+        return self.audiences.filter(
+            college=student.college,
+            standard=student.standard,
+            branch=student.branch,
+        ).exists()
+
+    def get_audience(self):
+        return set(self.audiences.values_list("college", "standard", "branch"))
+
+    def set_audience(self, audience):
+        # replaces the audience with the given (college, standard, branch)
+        audience = set(audience)
+        with transaction.atomic():
+            current = self.get_audience()
+            removed = models.Q()
+            for college, standard, branch in current - audience:
+                removed |= models.Q(college=college, standard=standard, branch=branch)
+            if removed:
+                self.audiences.filter(removed).delete()
+            ExamAudience.objects.bulk_create(
+                ExamAudience(exam=self, college=college, standard=standard, branch=branch)
+                for college, standard, branch in audience - current
+            )
+            transaction.on_commit(clear_open_exams)
+
+    def __str__(self):
+        return self.name
+
+
+def build_open_exams(now):
+    # the open exams with their audiences, and when the next exam starts or
+    # ends
+    exams = [
+        (exam, frozenset((a.college, a.standard, a.branch) for a in exam.audiences.all()))
+        for exam in Exam.objects.open(now).defer("search").prefetch_related("audiences")
+    ]
+    times = Exam.objects.filter(num_questions__gt=0).aggregate(
+        start=models.Min("start_time", filter=models.Q(start_time__gt=now)),
+        end=models.Min("end_time", filter=models.Q(end_time__gte=now)),
+    )
+    return exams, min((t for t in times.values() if t is not None), default=None)
 
-    @admin.display(description="no. of questions")
-    def get_num_questions(self):
-        return self.question_set.filter(deleted=None).count()
 
-    @admin.display(description="max marks")
-    def get_max_marks(self):
-        marks = 0
-        for question in self.question_set.filter(deleted=None):
-            marks += question.marks_on_correct_answer
-        return marks
+def get_open_exams_for(student):
+    # open exams the student may take, newest first, from the cache
+    key = (student.college, student.standard, student.branch)
+    return [exam for exam, audience in get_open_exams(build_open_exams) if key in audience]
+
+
+class ExamAudience(models.Model):
+    # students of the college, standard and branch may take the exam
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name="audiences")
+    college = models.CharField(max_length=5, choices=COLLEGE_CHOICES)
+    standard = models.CharField(max_length=2, choices=STANDARD_CHOICES)
+    branch = models.CharField(max_length=5, choices=BRANCH_CHOICES)
+
+    class Meta:
+        # also the index of the student's lookup of their exams
+        constraints = [
+            models.UniqueConstraint(
+                fields=["college", "standard", "branch", "exam"],
+                name="unique_exam_audience",
+            ),
+        ]
 
     def __str__(self):
-        return self.name
+        return f"{self.get_college_display()} - {self.get_standard_display()} - {self.get_branch_display()}"
+
+
+class QuestionQuerySet(models.QuerySet):
+    def current(self):
+        return self.filter(version_removed=None)
+
+    def in_version(self, version):
+        return self.filter(
+            models.Q(version_removed=None) | models.Q(version_removed__gt=version),
+            version_added__lte=version,
+        )
 
 
 class Question(models.Model):
@@ -77,79 +241,268 @@ class Question(models.Model):
     correct_answer = models.CharField(max_length=1, choices=ANSWER_CHOICES, default=A)
     marks_on_correct_answer = models.FloatField(default=1)
     marks_on_wrong_answer = models.FloatField(default=0)
-    deleted = models.DateTimeField(null=True, blank=True)
+    # the question belongs to exam versions [version_added, version_removed)
+    version_added = models.PositiveIntegerField(default=1)
+    version_removed = models.PositiveIntegerField(null=True, blank=True)
+    # first revision of an edited question
+    origin = models.ForeignKey(
+        "self", on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    # question and options as a text search document, kept up to date by a
+    # database trigger
+    search = SearchVectorField(null=True, editable=False)
+
+    objects = QuestionQuerySet.as_manager()
 
     class Meta:
-        ordering = ("created",)
+        # questions imported together share their creation time
+        ordering = ("created", "pk")
+        indexes = [
+            models.Index(fields=["exam", "version_added", "version_removed"]),
+            GinIndex(fields=["search"]),
+        ]
+
+    def is_published(self):
+        # part of a version some session was started on
+        return Session.objects.filter(
+            exam_id=self.exam_id, exam_version__gte=self.version_added
+        ).exists()
+
+    def save_revision(self, version):
+        # published rows are immutable, save the changes as a new row which
+        # replaces this one from the given version on
+        Question.objects.filter(pk=self.pk).update(version_removed=version)
+        created = self.created
+        self.origin_id = self.origin_id or self.pk
+        self.pk = None
+        self._state.adding = True
+        self.version_added = version
+        self.save()
+        # keep the position of the question in the exam
+        Question.objects.filter(pk=self.pk).update(created=created)
+        self.created = created
+
+    def get_payload(self):
+        return {
+            "question": self.question,
+            "image_url": self.image.url if self.image else None,
+            "option_A": self.option_A,
+            "option_B": self.option_B,
+            "option_C": self.option_C,
+            "option_D": self.option_D,
+            "marks_on_correct_answer": self.marks_on_correct_answer,
+            "marks_on_wrong_answer": self.marks_on_wrong_answer,
+        }
 
     def __str__(self):
         return self.question
 
 
+def get_version_questions(exam_pk, version, regraded):
+    return get_exam_questions(
+        exam_pk,
+        version,
+        regraded,
+        Question.objects.filter(exam_id=exam_pk).in_version(version).defer("search"),
+    )
+
+
+def get_version_payloads(exam_pk, version, regraded):
+    return get_exam_payloads(
+        exam_pk,
+        version,
+        regraded,
+        lambda: get_version_questions(exam_pk, version, regraded),
+    )
+
+
+def session_score_expressions():
+    # marks, max marks, attempted and total questions of a session as
+    # correlated subqueries, for set-based updates of the stored scores
+    answers = Answer.objects.filter(session=models.OuterRef("pk")).values("session")
+    marks = answers.annotate(
+        marks=models.Sum(
+            models.Case(
+                models.When(
+                    answer=models.F("question__correct_answer"),
+                    then=models.F("question__marks_on_correct_answer"),
+                ),
+                default=models.F("question__marks_on_wrong_answer"),
+            )
+        )
+    ).values("marks")
+    attempted = answers.annotate(count=models.Count("pk")).values("count")
+    max_marks = (
+        Question.objects.filter(pk=ArrayAny(models.OuterRef("question_ids")))
+        .values("exam")
+        .annotate(marks=models.Sum("marks_on_correct_answer"))
+        .values("marks")
+    )
+
+    return {
+        "marks": Coalesce(models.Subquery(marks), 0.0),
+        "max_marks": Coalesce(models.Subquery(max_marks), 0.0),
+        "num_attempted": Coalesce(models.Subquery(attempted), 0),
+        "num_total": models.Func(
+            models.F("question_ids"),
+            function="cardinality",
+            output_field=models.IntegerField(),
+        ),
+    }
+
+
+class SessionQuerySet(models.QuerySet):
+    def expired(self):
+        # left to exam_submit until the final sync can no longer arrive
+        return self.filter(
+            completed=False, deadline__lt=timezone.now() - SYNC_GRACE_PERIOD
+        )
+
+    def finalize(self, submitted=None):
+        # sessions that ran out of time count as submitted at their deadline
+        with transaction.atomic():
+            pks = list(
+                self.filter(completed=False)
+                .select_for_update()
+                .values_list("pk", flat=True)
+            )
+            sessions = Session.objects.filter(pk__in=pks)
+            sessions.update(
+                completed=True, submitted=submitted or models.F("deadline")
+            )
+            sessions.grade()
+
+        return len(pks)
+
+    def grade(self):
+        # (re)computes the stored scores, only called when sessions are
+        # finalized and on an explicit regrade
+        self.update(**session_score_expressions())
+        passing_percentage = Exam.objects.filter(
+            pk=models.OuterRef("exam_id")
+        ).values("passing_percentage")
+        self.update(
+            passed=models.ExpressionWrapper(
+                models.Q(
+                    marks__gte=models.F("max_marks")
+                    * models.Subquery(passing_percentage)
+                    / 100
+                ),
+                output_field=models.BooleanField(),
+            )
+        )
+
+    def with_expired(self):
+        # lets write endpoints check the deadline in the query that fetches
+        # the session
+        return self.annotate(
+            expired=models.ExpressionWrapper(
+                models.Q(deadline__lt=timezone.now()),
+                output_field=models.BooleanField(),
+            )
+        )
+
+
 class Session(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
     exam = models.ForeignKey(Exam, on_delete=models.CASCADE)
+    exam_version = models.PositiveIntegerField()
     seed = models.PositiveIntegerField()
+    # pks of the questions in the order they are shown to the student
+    question_ids = ArrayField(models.BigIntegerField(), default=list)
     completed = models.BooleanField(default=False)
     bookmarks = models.ManyToManyField(Question)
     created = models.DateTimeField(auto_now_add=True)
     submitted = models.DateTimeField(null=True, blank=True)
     end_time = models.DateTimeField()  # exam end time when this session was created
+    # min(created + exam duration, end_time)
+    deadline = models.DateTimeField()
+    # scores, computed when the session is finalized
+    marks = models.FloatField(null=True, blank=True)
+    max_marks = models.FloatField("max marks", null=True, blank=True)
+    num_attempted = models.PositiveIntegerField(
+        "no. of attempted questions", null=True, blank=True
+    )
+    num_total = models.PositiveIntegerField("no. of questions", null=True, blank=True)
+    passed = models.BooleanField("pass", null=True, blank=True)
+
+    objects = SessionQuerySet.as_manager()
 
     class Meta:
         ordering = ("-created",)
+        indexes = [models.Index(fields=["completed", "deadline"])]
+
+    def get_question_map(self):
+        return get_version_questions(
+            self.exam_id, self.exam_version, self.exam.regraded
+        )
 
     def get_questions(self):
-        questions = list(self.exam.question_set.filter(created__lt=self.created))
-        questions = [q for q in questions if not q.deleted or q.deleted > self.created]
-        rand = random.Random(self.seed)
-        rand.shuffle(questions)
+        questions = self.get_question_map()
+        return [questions[pk] for pk in self.question_ids]
 
-        return questions
+    def get_payload_map(self):
+        return get_version_payloads(
+            self.exam_id, self.exam_version, self.exam.regraded
+        )
 
-    @admin.display(description="no. of attempted questions")
-    def get_num_attempted_que(self):
-        return self.answer_set.all().count()
+    def get_payloads(self):
+        payloads = self.get_payload_map()
+        return [payloads[pk] for pk in self.question_ids]
+
+    def get_question(self, q_num):
+        if q_num < 1:
+            raise IndexError(q_num)
+        return self.get_question_map()[self.question_ids[q_num - 1]]
 
-    @admin.display(description="no. of questions")
     def get_num_total_que(self):
-        return len(self.get_questions())
+        return len(self.question_ids)
 
     def get_timeover_timestamp(self):
-        dt = self.created + self.exam.duration
-        if self.end_time < dt:
-            return self.end_time.timestamp()
-        return dt.timestamp()
-
-    @admin.display(description="marks")
-    def get_marks(self):
-        marks = 0
-        for answer in self.answer_set.all():
-            marks += answer.get_marks()
-        return marks
-
-    @admin.display(description="max marks")
-    def get_max_marks(self):
-        marks = 0
-        for question in self.get_questions():
-            marks += question.marks_on_correct_answer
-        return marks
-
-    @admin.display(description="pass", boolean=True)
-    def get_passing_status(self):
-        percentage = self.get_marks() / self.get_max_marks() * 100
-        return percentage >= self.exam.passing_percentage
+        return self.deadline.timestamp()
 
     def __str__(self):
         return self.exam.name
 
 
+class AnswerQuerySet(models.QuerySet):
+    def upsert(self, answers):
+        # INSERT ... ON CONFLICT DO UPDATE, one statement for the whole batch
+        answers = list(answers)
+        if not answers:
+            return
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        values = ", ".join(["(%s, %s, %s)"] * len(answers))
+        sql = (
+            f"INSERT INTO {qn(self.model._meta.db_table)} "
+            f"({qn('session_id')}, {qn('question_id')}, {qn('answer')}) "
+            f"VALUES {values} "
+            f"ON CONFLICT ({qn('session_id')}, {qn('question_id')}) "
+            f"DO UPDATE SET {qn('answer')} = EXCLUDED.{qn('answer')}"
+        )
+        params = []
+        for answer in answers:
+            params += [answer.session_id, answer.question_id, answer.answer]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+
 class Answer(models.Model):
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     session = models.ForeignKey(Session, on_delete=models.CASCADE)
     answer = models.CharField(max_length=1, choices=ANSWER_CHOICES, default=A)
 
+    objects = AnswerQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["session", "question"], name="unique_session_question"
+            ),
+        ]
+
     def get_answer_status(self):
         return self.answer == self.question.correct_answer
 
@@ -160,3 +513,51 @@ class Answer(models.Model):
 
     def __str__(self):
         return self.answer
+
+
+class Regrade(models.Model):
+    # a fix of the answer key or marks of a question, applied to all its
+    # revisions and to every completed session which had one of them
+    created = models.DateTimeField(auto_now_add=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    correct_answer = models.CharField(max_length=1, choices=ANSWER_CHOICES)
+    marks_on_correct_answer = models.FloatField()
+    marks_on_wrong_answer = models.FloatField()
+    num_sessions = models.PositiveIntegerField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    failed = models.BooleanField(default=False)
+
+    class Meta:
+        ordering = ("-created",)
+
+    def get_status_display(self):
+        if self.failed:
+            return "Failed"
+        if self.finished:
+            return "Done"
+        return "Running"
+
+    def __str__(self):
+        return str(self.question)
+
+
+class RegradeChange(models.Model):
+    # scores of a session before and after a regrade
+    regrade = models.ForeignKey(Regrade, on_delete=models.CASCADE, related_name="changes")
+    session = models.ForeignKey(Session, on_delete=models.CASCADE)
+    marks_before = models.FloatField(null=True, blank=True)
+    marks_after = models.FloatField(null=True, blank=True)
+    passed_before = models.BooleanField(null=True, blank=True)
+    passed_after = models.BooleanField(null=True, blank=True)
+
+    class Meta:
+        ordering = ("session",)
+        constraints = [
+            models.UniqueConstraint(
+                fields=["regrade", "session"], name="unique_regrade_session"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.marks_before} -> {self.marks_after}"
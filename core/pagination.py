@@ -0,0 +1,208 @@
+import datetime
+import json
+import operator
+from functools import reduce
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections
+from django.db.models import F, Q
+
+PAGE_SIZE = 15
+CURSOR_SALT = "core.pagination"
+NEXT = "next"
+PREVIOUS = "previous"
+# the ordering of cursors into a list in memory
+OFFSET = ["offset"]
+
+
+class KeysetPage:
+    # a page of rows found by the ordering values of the row next to it
+    # instead of by an offset, so a deep page costs the same as the first.
+    # the cursors are opaque, signed values for the "cursor" parameter.
+
+    def __init__(self, object_list, previous_cursor, next_cursor, count=None):
+        self.object_list = object_list
+        self.previous_cursor = previous_cursor
+        self.next_cursor = next_cursor
+        self.count = count
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+
+def resolve_path(model, path):
+    # the path compared by the database and whether it can be null. ordering
+    # by a relation compares the related primary key, annotations (such as
+    # search rank) are taken to be nullable.
+    if path == "pk":
+        return path, False
+    names = path.split("__")
+    try:
+        for i, name in enumerate(names):
+            field = model._meta.get_field(name)
+            if field.null:
+                nullable = True
+                break
+            model = field.related_model
+        else:
+            nullable = False
+        if field.is_relation and name != field.attname and i == len(names) - 1:
+            path = f"{path}_id"
+    except FieldDoesNotExist:
+        nullable = True
+
+    return path, nullable
+
+
+def get_ordering(queryset):
+    # the ordering of the queryset by compared paths, with the primary key
+    # as tie-breaker
+    ordering = [
+        ("-" if field.startswith("-") else "")
+        + resolve_path(queryset.model, field.lstrip("-"))[0]
+        for field in queryset.query.order_by or queryset.model._meta.ordering
+    ]
+    if not any(field.lstrip("-") in ("pk", "id") for field in ordering):
+        ordering.append("pk" if ordering and not ordering[0].startswith("-") else "-pk")
+    return ordering
+
+
+def reverse_ordering(ordering):
+    return [field[1:] if field.startswith("-") else f"-{field}" for field in ordering]
+
+
+def encode_cursor(ordering, direction, values):
+    values = [
+        value.isoformat() if isinstance(value, (datetime.date, datetime.time)) else value
+        for value in values
+    ]
+    return signing.dumps([ordering, direction, values], salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(cursor, ordering):
+    # the direction and values of a cursor, or None for a missing, tampered
+    # or stale cursor (the ordering of the list changed)
+    if not cursor:
+        return None
+    try:
+        cursor_ordering, direction, values = signing.loads(cursor, salt=CURSOR_SALT)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+    if cursor_ordering != ordering or direction not in (NEXT, PREVIOUS):
+        return None
+    return direction, values
+
+
+def seek(model, ordering, values):
+    # rows after the row with the given values in the ordering. postgres
+    # sorts nulls above every value, last ascending and first descending.
+    conditions, equal = [], Q()
+    for field, value in zip(ordering, values):
+        descending = field.startswith("-")
+        path, nullable = resolve_path(model, field.lstrip("-"))
+        if value is None:
+            after = Q(**{f"{path}__isnull": False}) if descending else None
+            same = Q(**{f"{path}__isnull": True})
+        else:
+            after = Q(**{f"{path}__{'lt' if descending else 'gt'}": value})
+            if nullable and not descending:
+                after |= Q(**{f"{path}__isnull": True})
+            same = Q(**{path: value})
+        if after is not None:
+            conditions.append(equal & after)
+        equal &= same
+
+    # the primary key ends every ordering, so there is at least one
+    return reduce(operator.or_, conditions)
+
+
+def approximate_count(queryset):
+    # the planner's estimate of the number of rows, without counting them
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]["Plan Rows"]
+
+
+def paginate(request, queryset, per_page=PAGE_SIZE, count=False):
+    # the page of the queryset at the "cursor" parameter, the first page
+    # without one. with count the page carries the approximate number of
+    # rows in the whole list.
+    ordering = get_ordering(queryset)
+    keys = [f"_keyset_{i}" for i in range(len(ordering))]
+    rows = queryset.annotate(
+        **{key: F(field.lstrip("-")) for key, field in zip(keys, ordering)}
+    )
+    cursor = decode_cursor(request.GET.get("cursor", ""), ordering)
+
+    def first_page():
+        objects = list(rows.order_by(*ordering)[: per_page + 1])
+        return objects[:per_page], False, len(objects) > per_page
+
+    if cursor is None:
+        objects, has_previous, has_next = first_page()
+    elif cursor[0] == NEXT:
+        objects = list(
+            rows.filter(seek(queryset.model, ordering, cursor[1]))
+            .order_by(*ordering)[: per_page + 1]
+        )
+        has_previous, has_next = True, len(objects) > per_page
+        objects = objects[:per_page]
+    else:
+        reverse = reverse_ordering(ordering)
+        objects = list(
+            rows.filter(seek(queryset.model, reverse, cursor[1]))
+            .order_by(*reverse)[: per_page + 1]
+        )
+        has_previous, has_next = len(objects) > per_page, True
+        objects = objects[:per_page][::-1]
+    # a stale cursor past either end of the list shows the first page
+    if cursor is not None and not objects:
+        objects, has_previous, has_next = first_page()
+
+    def values(obj):
+        return [getattr(obj, key) for key in keys]
+
+    previous_cursor = encode_cursor(ordering, PREVIOUS, values(objects[0])) if has_previous else None
+    next_cursor = encode_cursor(ordering, NEXT, values(objects[-1])) if has_next else None
+    if not count:
+        total = None
+    elif not has_previous and not has_next:
+        total = len(objects)
+    else:
+        # the estimate can not be below what is known to exist
+        total = max(approximate_count(queryset), len(objects) + has_next)
+
+    return KeysetPage(objects, previous_cursor, next_cursor, total)
+
+
+def paginate_list(request, objects, per_page=PAGE_SIZE):
+    # a page of a list already in memory, the cursors hold the position
+    cursor = decode_cursor(request.GET.get("cursor", ""), OFFSET)
+    start = cursor[1][0] if cursor else 0
+    if not 0 <= start < len(objects):
+        start = 0
+
+    stop = start + per_page
+    previous_cursor = (
+        encode_cursor(OFFSET, PREVIOUS, [max(start - per_page, 0)]) if start else None
+    )
+    next_cursor = encode_cursor(OFFSET, NEXT, [stop]) if stop < len(objects) else None
+    return KeysetPage(objects[start:stop], previous_cursor, next_cursor, len(objects))
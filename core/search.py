@@ -0,0 +1,21 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+
+# text search configuration of the search columns, see migration 0019
+SEARCH_CONFIG = "english"
+
+
+def full_text_search(queryset, text, field="search"):
+    # rows whose search document matches text, best matches first and ties
+    # in the usual order. text takes web search syntax: "quoted phrases",
+    # or, and -excluded words.
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type="websearch")
+    ordering = queryset.query.order_by or queryset.model._meta.ordering
+    return (
+        queryset.filter(**{field: query})
+        # as double precision so the rank survives a round trip through a
+        # pagination cursor
+        .annotate(rank=Cast(SearchRank(F(field), query), FloatField()))
+        .order_by("-rank", *ordering)
+    )
@@ -86,34 +86,99 @@ jQuery_3_6_0(document).ready(function(){
         $alert_container.empty().append(alert);
     }
 
-    function get_question(){
-        jQuery_3_6_0.ajax({
-            type: 'GET',
-            url: jQuery_3_6_0(this).attr('data-href'),
+    // The whole paper is loaded once and questions are shown from it
+    const paper_url = $question_form.attr('data-paper-url');
+    let paper = null;
+
+    // Answer operations are buffered and sent to the server in batches
+    const sync_url = $question_form.attr('data-sync-url');
+    const csrf_token = $question_form.find('input[name=csrfmiddlewaretoken]').val();
+    const $input_ops = jQuery_3_6_0('#submit-form input[name=ops]');
+    const SYNC_INTERVAL = 5000;
+
+    let pending_ops = [];
+    let sending_ops = [];
+    let syncing = null;
+
+    function update_input_ops(){
+        // not yet acknowledged ops are submitted along with the exam
+        $input_ops.val(JSON.stringify(sending_ops.concat(pending_ops)));
+    }
+
+    function queue_op(op){
+        pending_ops.push(op);
+        update_input_ops();
+    }
+
+    function sync(){
+        if (syncing || !pending_ops.length){
+            return;
+        }
+
+        sending_ops = pending_ops;
+        pending_ops = [];
+        syncing = jQuery_3_6_0.ajax({
+            type: 'POST',
+            url: sync_url,
+            data: {
+                csrfmiddlewaretoken: csrf_token,
+                ops: JSON.stringify(sending_ops),
+            },
             success: function (data){
-                $alert_container.empty();
-                $question_form.trigger('reset');
-                update_question(data);
-                update_pagination(data);
+                // every op has a result, show all failed ones
+                const errors = data.results.filter(function(result){
+                    return result.status != 'ok';
+                });
+                if (errors.length){
+                    alert_message('danger', errors.map(function(result){
+                        return result.message;
+                    }).join('<br>'));
+                }
+                else if (data.results.length){
+                    const result = data.results[data.results.length - 1];
+                    alert_message('success', result.message);
+                }
             },
-            error: function(data){
-                console.error('FAILED TO GET QUESTION');
-                console.error(data);
+            error: function(xhr){
+                console.error('FAILED TO SYNC');
+                console.error(xhr);
+                if (xhr.status >= 400 && xhr.status < 500){
+                    // rejected ops fail the same way when sent again
+                    const message = xhr.responseJSON && xhr.responseJSON.message;
+                    alert_message('danger', message || 'Changes could not be saved.');
+                }
+                else{
+                    // keep the ops to retry them on the next sync
+                    pending_ops = sending_ops.concat(pending_ops);
+                }
             }
+        }).always(function(){
+            sending_ops = [];
+            syncing = null;
+            update_input_ops();
         });
     }
 
-    function ajax_submit_form(success_func){
-        jQuery_3_6_0.ajax({
-            type: jQuery_3_6_0(this).attr('method'),
-            url: jQuery_3_6_0(this).attr('action'),
-            data: jQuery_3_6_0(this).serialize(),
-            success: success_func,
-            error: function(data) {
-                console.error('FAILED');
-                console.error(data);
-            }
+    function current_q_num(){
+        return parseInt($input_q_num.attr('value'));
+    }
+
+    function show_question(q_num){
+        const data = Object.assign({}, paper.questions[q_num - 1], {
+            q_num: q_num,
+            prev_q_num: q_num > 1 ? q_num - 1 : null,
+            next_q_num: q_num < paper.questions.length ? q_num + 1 : null,
+            answer: paper.answers[q_num - 1],
         });
+        $alert_container.empty();
+        $question_form.trigger('reset');
+        update_question(data);
+        update_pagination(data);
+    }
+
+    function get_question(){
+        const params = new URLSearchParams(jQuery_3_6_0(this).attr('data-href'));
+        show_question(parseInt(params.get('question')));
     }
 
     // Submit on option select
@@ -121,46 +186,46 @@ jQuery_3_6_0(document).ready(function(){
         $question_form.submit();
     });
 
-    // Submit form with ajax
     $question_form.submit(function () {
-        ajax_submit_form.bind(this)(function (data) {
-            if (data.status == 'ok'){
-                alert_message('success', data.message);
-                $clear_btn.prop('disabled', false);
-            }
-            else{
-                alert_message('danger', data.message);
-            }
-        });
+        const q_num = current_q_num();
+        const answer = $question_form.find('input[name="answer"]:checked').val();
+        paper.answers[q_num - 1] = answer;
+        queue_op({op: 'answer', q_num: q_num, answer: answer});
+        $clear_btn.prop('disabled', false);
         return false;
     });
 
     $clear_form.submit(function () {
-        ajax_submit_form.bind(this)(function (data) {
-            if (data.status == 'ok'){
-                alert_message('success', data.message);
-                $question_form.trigger('reset');
-                $clear_btn.prop('disabled', true);
-            }
-            else{
-                alert_message('danger', data.message);
-            }
-        });
+        const q_num = current_q_num();
+        paper.answers[q_num - 1] = null;
+        queue_op({op: 'clear', q_num: q_num});
+        $question_form.trigger('reset');
+        $clear_btn.prop('disabled', true);
         return false;
     });
 
     $bookmark_form.submit(function () {
-        ajax_submit_form.bind(this)(function (data) {
-            if (data.status == 'ok'){
-                alert_message('success', data.message);
-            }
-            else{
-                alert_message('danger', data.message);
-            }
-        });
+        const q_num = current_q_num();
+        const bookmark = !paper.bookmarks[q_num - 1];
+        paper.bookmarks[q_num - 1] = bookmark;
+        queue_op({op: 'bookmark', q_num: q_num, bookmark: bookmark});
+        alert_message('success', bookmark ? 'Bookmark added.' : 'Bookmark removed.');
         return false;
     });
 
+    setInterval(sync, SYNC_INTERVAL);
+
+    // Last chance to send buffered ops when the tab is closed
+    jQuery_3_6_0(window).on('pagehide', function(){
+        const ops = sending_ops.concat(pending_ops);
+        if (ops.length){
+            const data = new FormData();
+            data.append('csrfmiddlewaretoken', csrf_token);
+            data.append('ops', JSON.stringify(ops));
+            navigator.sendBeacon(sync_url, data);
+        }
+    });
+
     // Pagination
     jQuery_3_6_0('#first, #last')
     .add($prev)
@@ -178,30 +243,31 @@ jQuery_3_6_0(document).ready(function(){
 
     // Get all questions
     $btn_all_ques.click(function(){
-        jQuery_3_6_0.ajax({
-            type: 'GET',
-            url: jQuery_3_6_0(this).attr('data-href'),
-            success: function (data){
-                $question_list.empty();
-                data.questions.forEach((que, i) => {
-                    q_num = i+1
-                    const link_question = $tmpl_btn_que
-                    .clone(true)
-                    .text(q_num + '. ' + que.answer)
-                    .attr('data-href', '?question='+q_num);
-                    if (que.bookmark){
-                        link_question.addClass('list-group-item-warning');
-                    }
-                    $question_list.append(link_question);
-                });
-            },
-            error: function(data){
-                console.error('FAILED TO GET QUESTIONS');
-                console.error(data);
+        $question_list.empty();
+        paper.answers.forEach((answer, i) => {
+            q_num = i+1
+            const link_question = $tmpl_btn_que
+            .clone(true)
+            .text(q_num + '. ' + answer)
+            .attr('data-href', '?question='+q_num);
+            if (paper.bookmarks[i]){
+                link_question.addClass('list-group-item-warning');
             }
+            $question_list.append(link_question);
         });
     });
 
-    // Get initial question
-    jQuery_3_6_0('#first').click();
+    // Get the paper and show the first question
+    jQuery_3_6_0.ajax({
+        type: 'GET',
+        url: paper_url,
+        success: function (data){
+            paper = data;
+            jQuery_3_6_0('#first').click();
+        },
+        error: function(data){
+            console.error('FAILED TO GET PAPER');
+            console.error(data);
+        }
+    });
 });
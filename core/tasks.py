@@ -0,0 +1,136 @@
+import logging
+from datetime import timedelta
+from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, Min, OuterRef, Q, Subquery
+from django.utils import timezone
+from .analytics import get_item_analysis
+from .cache import clear_exam_questions
+from .collusion import get_collusion_report
+from .models import Exam, Question, Regrade, RegradeChange, Session
+
+logger = logging.getLogger(__name__)
+
+FINALIZE_BATCH_SIZE = 1000
+
+
+@shared_task
+def finalize_expired_sessions():
+    # submit sessions whose time ran out but were never submitted by the
+    # browser (closed tabs), in batches of primary keys
+    finalized = 0
+    while True:
+        pks = list(
+            Session.objects.expired()
+            .order_by("deadline")
+            .values_list("pk", flat=True)[:FINALIZE_BATCH_SIZE]
+        )
+        if not pks:
+            break
+
+        finalized += Session.objects.filter(pk__in=pks).finalize()
+        scores = Session.objects.filter(pk__in=pks).aggregate(
+            avg_marks=Avg("marks"),
+            attempted=Count("pk", filter=Q(num_attempted__gt=0)),
+        )
+        logger.info(
+            "Finalized %d expired sessions, %d with answers, average marks %.2f",
+            len(pks),
+            scores["attempted"],
+            scores["avg_marks"] or 0,
+        )
+
+    return finalized
+
+
+@shared_task
+def regrade_sessions(regrade_pk):
+    regrade = Regrade.objects.select_related("question__exam").get(pk=regrade_pk)
+    if regrade.finished:
+        return
+    exam = regrade.question.exam
+    item_pk = regrade.question.origin_id or regrade.question.pk
+
+    try:
+        with transaction.atomic():
+            revisions = Question.objects.filter(Q(pk=item_pk) | Q(origin_id=item_pk))
+            revision_pks = list(revisions.values_list("pk", flat=True))
+            revisions.update(
+                correct_answer=regrade.correct_answer,
+                marks_on_correct_answer=regrade.marks_on_correct_answer,
+                marks_on_wrong_answer=regrade.marks_on_wrong_answer,
+            )
+            exam.update_question_counters()
+
+            # scores before the regrade, locking the sessions
+            sessions = Session.objects.filter(
+                exam=exam, completed=True, question_ids__overlap=revision_pks
+            )
+            RegradeChange.objects.bulk_create(
+                (
+                    RegradeChange(
+                        regrade=regrade,
+                        session_id=pk,
+                        marks_before=marks,
+                        passed_before=passed,
+                    )
+                    for pk, marks, passed in sessions.select_for_update().values_list(
+                        "pk", "marks", "passed"
+                    )
+                ),
+                batch_size=FINALIZE_BATCH_SIZE,
+            )
+            sessions.grade()
+            after = Session.objects.filter(pk=OuterRef("session_id"))
+            num_sessions = regrade.changes.update(
+                marks_after=Subquery(after.values("marks")),
+                passed_after=Subquery(after.values("passed")),
+            )
+
+            now = timezone.now()
+            Exam.objects.filter(pk=exam.pk).update(regraded=now)
+            Regrade.objects.filter(pk=regrade.pk).update(
+                num_sessions=num_sessions, finished=now
+            )
+    except Exception:
+        logger.exception("Regrade %d failed", regrade.pk)
+        Regrade.objects.filter(pk=regrade.pk).update(failed=True)
+        raise
+
+    # the new regrade time makes every process miss the cached questions,
+    # the entries before it of every version the revisions were part of are
+    # dropped
+    first_version = revisions.aggregate(first=Min("version_added"))["first"]
+    regraded = exam.regraded
+    exam.refresh_from_db(fields=["version", "regraded"])
+    clear_exam_questions(exam.pk, range(first_version, exam.version + 1), regraded)
+    logger.info("Regraded %d sessions of exam %d", num_sessions, exam.pk)
+
+
+@shared_task
+def warm_exam_caches():
+    # load the questions of exams about to start into the cache ahead of the
+    # students, who all start at the same moment. exams already warmed are
+    # found in the cache.
+    now = timezone.now()
+    exams = Exam.objects.filter(
+        num_questions__gt=0,
+        start_time__gt=now,
+        start_time__lte=now + timedelta(seconds=settings.EXAM_WARMUP_LEAD_TIME),
+    ).only("pk", "version", "regraded")
+    for exam in exams:
+        exam.warm_cache()
+
+    return len(exams)
+
+
+@shared_task
+def compute_item_analysis(exam_pk):
+    # the analysis is read from the cache by the page
+    get_item_analysis(Exam.objects.get(pk=exam_pk))
+
+
+@shared_task
+def compute_collusion_report(exam_pk):
+    get_collusion_report(Exam.objects.get(pk=exam_pk))
@@ -1,3 +1,1015 @@
-from django.test import TestCase
+import io
+import json
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+import numpy as np
+from PIL import Image
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, connection, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.migrations.loader import MigrationLoader
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.urls import reverse
+from django.utils import timezone
+from users.models import Student, Teacher, User
+from .analytics import analyze_items
+from .cache import get_or_compute
+from .collusion import score_pairs
+from .forms import ExamForm
+from .imports import ImportFileError, import_questions
+from .models import (
+    SYNC_GRACE_PERIOD,
+    Answer,
+    Exam,
+    Question,
+    Regrade,
+    Session,
+)
+from .pagination import paginate
+from .tasks import (
+    compute_collusion_report,
+    compute_item_analysis,
+    finalize_expired_sessions,
+    regrade_sessions,
+)
+from .views import apply_answer_ops
 
-# Create your tests here.
+# a cache of the test process alone, entries of the shared cache could be left
+# from an earlier run with the same primary keys
+LOCAL_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+}
+
+
+def create_exam(name="Exam"):
+    teacher = User.objects.create_user(
+        f"{name}-teacher", password="pw", is_teacher=True
+    )
+    Teacher.objects.create(user=teacher)
+    now = timezone.now()
+    return Exam.objects.create(
+        user=teacher,
+        name=name,
+        start_time=now - timedelta(hours=1),
+        end_time=now + timedelta(hours=1),
+        show_result=True,
+    )
+
+
+def create_question(exam, text="Question", **fields):
+    return Question.objects.create(
+        exam=exam,
+        question=text,
+        option_A="a",
+        option_B="b",
+        option_C="c",
+        option_D="d",
+        **{"correct_answer": "A", **fields},
+    )
+
+
+def create_session(exam, username="student", deadline=None):
+    user = User.objects.create_user(username, password="pw", is_student=True)
+    student = Student.objects.create(
+        user=user,
+        full_name=username,
+        email=f"{username}@example.com",
+        phone="1234567890",
+    )
+    return Session.objects.create(
+        user=user,
+        student=student,
+        exam=exam,
+        exam_version=exam.version,
+        seed=1,
+        question_ids=list(exam.question_set.values_list("pk", flat=True)),
+        end_time=exam.end_time,
+        deadline=deadline or exam.end_time,
+    )
+
+
+class AnswerUpsertTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.exam = create_exam()
+        cls.first = create_question(cls.exam, "First")
+        cls.second = create_question(cls.exam, "Second")
+        cls.session = create_session(cls.exam)
+
+    def answers(self):
+        return dict(self.session.answer_set.values_list("question_id", "answer"))
+
+    def test_inserts_new_answers(self):
+        Answer.objects.upsert(
+            [
+                Answer(session=self.session, question=self.first, answer="B"),
+                Answer(session=self.session, question=self.second, answer="C"),
+            ]
+        )
+        self.assertEqual(self.answers(), {self.first.pk: "B", self.second.pk: "C"})
+
+    def test_updates_existing_answer_in_place(self):
+        Answer.objects.create(session=self.session, question=self.first, answer="B")
+        Answer.objects.upsert(
+            [
+                Answer(session=self.session, question=self.first, answer="D"),
+                Answer(session=self.session, question=self.second, answer="A"),
+            ]
+        )
+        self.assertEqual(self.answers(), {self.first.pk: "D", self.second.pk: "A"})
+        self.assertEqual(self.session.answer_set.count(), 2)
+
+    def test_empty_batch_does_nothing(self):
+        with self.assertNumQueries(0):
+            Answer.objects.upsert([])
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        exam = create_exam()
+        for i in range(8):
+            create_session(exam, f"student{i}")
+        # every session ties on the sort key, only the primary key orders them
+        Session.objects.update(created=timezone.now())
+
+    def page(self, cursor=None):
+        request = RequestFactory().get("/", {"cursor": cursor} if cursor else {})
+        return paginate(request, Session.objects.all(), per_page=3)
+
+    def test_cursors_round_trip_over_ties(self):
+        expected = list(
+            Session.objects.order_by("-created", "-pk").values_list("pk", flat=True)
+        )
+
+        pages = [self.page()]
+        # bounded, a lost position would start over at the first page
+        while pages[-1].has_next and len(pages) <= len(expected):
+            pages.append(self.page(pages[-1].next_cursor))
+        forward = [[session.pk for session in page] for page in pages]
+        self.assertEqual(forward, [expected[:3], expected[3:6], expected[6:]])
+        self.assertFalse(pages[0].has_previous)
+
+        backward = [pages[-1]]
+        while backward[-1].has_previous and len(backward) <= len(expected):
+            backward.append(self.page(backward[-1].previous_cursor))
+        backward = [[session.pk for session in page] for page in reversed(backward)]
+        self.assertEqual(backward, forward)
+
+    def test_tampered_cursor_shows_first_page(self):
+        first = self.page()
+        self.assertEqual(list(self.page(first.next_cursor + "x")), list(first))
+
+
+class SessionDeadlineMigrationTests(TransactionTestCase):
+    # sessions started before 0015 get the deadline they were held to
+    migrate_from = [("core", "0014_remove_question_deleted")]
+    migrate_to = [("core", "0015_session_deadline")]
+
+    def migrate(self, targets):
+        # the models as of the migrations applied, of every app
+        MigrationExecutor(connection).migrate(targets)
+        loader = MigrationLoader(connection)
+        return loader.project_state(list(loader.applied_migrations)).apps
+
+    def setUp(self):
+        apps = self.migrate(self.migrate_from)
+        User = apps.get_model("users", "User")
+        Student = apps.get_model("users", "Student")
+        Exam = apps.get_model("core", "Exam")
+        Session = apps.get_model("core", "Session")
+
+        now = timezone.now()
+        teacher = User.objects.create(username="teacher", is_teacher=True)
+        exam = Exam.objects.create(
+            user=teacher,
+            name="Exam",
+            duration=timedelta(hours=1),
+            start_time=now - timedelta(hours=2),
+            end_time=now + timedelta(hours=2),
+            show_result=True,
+        )
+        self.sessions = {}
+        # one started long before the end, one less than the duration before it
+        for name, created in (
+            ("early", now - timedelta(hours=2)),
+            ("late", now + timedelta(hours=1, minutes=30)),
+        ):
+            user = User.objects.create(username=name, is_student=True)
+            student = Student.objects.create(
+                user=user,
+                full_name=name,
+                email=f"{name}@example.com",
+                phone="1234567890",
+            )
+            session = Session.objects.create(
+                user=user,
+                student=student,
+                exam=exam,
+                seed=1,
+                end_time=exam.end_time,
+                exam_version=1,
+            )
+            Session.objects.filter(pk=session.pk).update(created=created)
+            self.sessions[name] = (session.pk, created, exam.end_time)
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_deadline_is_backfilled(self):
+        apps = self.migrate(self.migrate_to)
+        Session = apps.get_model("core", "Session")
+
+        pk, created, end_time = self.sessions["early"]
+        deadline = Session.objects.get(pk=pk).deadline
+        self.assertEqual(deadline, created + timedelta(hours=1))
+        pk, created, end_time = self.sessions["late"]
+        self.assertEqual(Session.objects.get(pk=pk).deadline, end_time)
+
+
+class FinalizeExpiredSessionsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.exam = create_exam()
+        cls.exam.passing_percentage = 50
+        cls.exam.save()
+        cls.first = create_question(
+            cls.exam, "First", marks_on_correct_answer=2, marks_on_wrong_answer=-1
+        )
+        cls.second = create_question(cls.exam, "Second", correct_answer="B")
+        now = timezone.now()
+        cls.expired = create_session(
+            cls.exam, "expired", deadline=now - SYNC_GRACE_PERIOD - timedelta(minutes=1)
+        )
+        cls.in_grace = create_session(
+            cls.exam, "in_grace", deadline=now - SYNC_GRACE_PERIOD / 2
+        )
+        cls.running = create_session(
+            cls.exam, "running", deadline=now + timedelta(minutes=10)
+        )
+        # 2 marks for the first, none for the wrong second answer
+        Answer.objects.create(session=cls.expired, question=cls.first, answer="A")
+        Answer.objects.create(session=cls.expired, question=cls.second, answer="C")
+
+    def test_finalizes_sessions_past_the_grace_period_only(self):
+        self.assertEqual(finalize_expired_sessions(), 1)
+
+        self.expired.refresh_from_db()
+        self.assertTrue(self.expired.completed)
+        self.assertEqual(self.expired.submitted, self.expired.deadline)
+        self.assertFalse(Session.objects.get(pk=self.in_grace.pk).completed)
+        self.assertFalse(Session.objects.get(pk=self.running.pk).completed)
+
+    def scores(self):
+        return Session.objects.values_list(
+            "marks", "max_marks", "num_attempted", "num_total", "passed"
+        ).get(pk=self.expired.pk)
+
+    def test_stores_the_scores(self):
+        finalize_expired_sessions()
+
+        self.assertEqual(self.scores(), (2, 3, 2, 2, True))
+        # the same as grading the session again
+        Session.objects.filter(pk=self.expired.pk).grade()
+        self.assertEqual(self.scores(), (2, 3, 2, 2, True))
+
+    def test_finalizes_in_batches(self):
+        deadline = timezone.now() - SYNC_GRACE_PERIOD - timedelta(minutes=1)
+        for i in range(4):
+            create_session(self.exam, f"batch{i}", deadline=deadline)
+
+        with mock.patch("core.tasks.FINALIZE_BATCH_SIZE", 2):
+            self.assertEqual(finalize_expired_sessions(), 5)
+        self.assertFalse(Session.objects.expired().exists())
+        self.assertEqual(Session.objects.filter(completed=True).count(), 5)
+
+
+class ExamSubmitTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.exam = create_exam()
+        cls.question = create_question(cls.exam)
+
+    def submit(self, session, ops=()):
+        self.client.force_login(session.user)
+        return self.client.post(
+            reverse("exam_submit", args=[self.exam.pk]), {"ops": json.dumps(ops)}
+        )
+
+    def test_final_ops_in_the_grace_period_are_saved(self):
+        session = create_session(
+            self.exam, deadline=timezone.now() - SYNC_GRACE_PERIOD / 2
+        )
+        response = self.submit(session, [{"op": "answer", "q_num": 1, "answer": "A"}])
+
+        self.assertEqual(response.status_code, 200)
+        session.refresh_from_db()
+        self.assertTrue(session.completed)
+        self.assertEqual(session.marks, 1)
+
+    def test_final_ops_after_the_grace_period_are_dropped(self):
+        session = create_session(
+            self.exam, deadline=timezone.now() - SYNC_GRACE_PERIOD * 2
+        )
+        self.submit(session, [{"op": "answer", "q_num": 1, "answer": "A"}])
+
+        session.refresh_from_db()
+        self.assertTrue(session.completed)
+        self.assertFalse(session.answer_set.exists())
+
+    def test_submitting_a_finalized_session_shows_the_result(self):
+        session = create_session(
+            self.exam, deadline=timezone.now() - SYNC_GRACE_PERIOD * 2
+        )
+        finalize_expired_sessions()
+
+        response = self.submit(session, [{"op": "answer", "q_num": 1, "answer": "A"}])
+        self.assertContains(response, "Exam Submitted")
+        self.assertFalse(session.answer_set.exists())
+
+
+class AnalyzeItemsTests(SimpleTestCase):
+    # four students, three items keyed A, B and C, all given to everyone.
+    # scores 3, 2, 1 and 0, mean 1.5, variance 1.25
+    matrix = SimpleNamespace(
+        presented=np.ones((4, 3), dtype=bool),
+        correct=np.array(
+            [[1, 1, 1], [1, 1, 0], [1, 0, 0], [0, 0, 0]], dtype=bool
+        ),
+        # 1..4 for A..D, 0 for skipped
+        responses=np.array(
+            [[1, 2, 3], [1, 2, 4], [1, 3, 0], [2, 0, 4]], dtype=np.uint8
+        ),
+    )
+
+    def setUp(self):
+        self.stats = analyze_items(self.matrix)
+
+    def test_difficulty(self):
+        np.testing.assert_allclose(self.stats["difficulty"], [0.75, 0.5, 0.25])
+
+    def test_discrimination(self):
+        # (mean score of the correct - 1.5) / sqrt(1.25) * sqrt(p / (1 - p))
+        np.testing.assert_allclose(
+            self.stats["discrimination"],
+            [
+                0.5 / np.sqrt(1.25) * np.sqrt(3),
+                1 / np.sqrt(1.25),
+                1.5 / np.sqrt(1.25) * np.sqrt(1 / 3),
+            ],
+        )
+
+    def test_kr20(self):
+        # 3 / 2 * (1 - (0.1875 + 0.25 + 0.1875) / 1.25)
+        self.assertAlmostEqual(self.stats["kr20"], 0.75)
+
+    def test_option_counts(self):
+        self.assertEqual(
+            self.stats["option_counts"].tolist(),
+            [[3, 1, 0, 0], [0, 2, 1, 0], [0, 0, 1, 2]],
+        )
+        self.assertEqual(self.stats["omitted"].tolist(), [0, 1, 1])
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class ExamAnalysisViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.exam = create_exam()
+        question = create_question(cls.exam)
+        session = create_session(cls.exam)
+        Answer.objects.create(session=session, question=question, answer="A")
+        Session.objects.filter(pk=session.pk).finalize()
+
+    def setUp(self):
+        self.client.force_login(self.exam.user)
+
+    @mock.patch("core.views.compute_item_analysis.delay")
+    def test_computed_in_the_background(self, delay):
+        url = reverse("exam_analysis", args=[self.exam.pk])
+
+        self.assertContains(self.client.get(url), "is being computed")
+        self.assertContains(self.client.get(url), "is being computed")
+        delay.assert_called_once_with(self.exam.pk)
+
+        compute_item_analysis(self.exam.pk)
+        response = self.client.get(url)
+        self.assertNotContains(response, "is being computed")
+        self.assertEqual(response.context["analysis"]["num_sessions"], 1)
+
+
+class ScorePairsTests(SimpleTestCase):
+    def matrix(self):
+        # 30 students, 10 items keyed A. the others each miss three items with
+        # B, C or D in turn, students 7 and 20 give the same 8 wrong answers
+        responses = np.ones((30, 10), dtype=np.uint8)
+        for student in range(30):
+            for item in range(student % 10, student % 10 + 3):
+                responses[student, item % 10] = 2 + (student + item) % 3
+        responses[[7, 20]] = [2, 3, 4, 2, 3, 4, 2, 3, 1, 1]
+        return SimpleNamespace(
+            responses=responses,
+            correct=responses == 1,
+            presented=np.ones((30, 10), dtype=bool),
+            session_pks=np.arange(30),
+        )
+
+    def test_flags_the_pair_sharing_wrong_answers(self):
+        i, j, shared_wrong, shared_same, z = score_pairs(self.matrix())
+
+        self.assertEqual((i[0], j[0], shared_wrong[0], shared_same[0]), (7, 20, 8, 10))
+        self.assertGreaterEqual(z[0], 3)
+        # no two of the others share more than chance
+        self.assertTrue(all({a, b} & {7, 20} for a, b in zip(i, j)))
+
+    def test_blocks_give_the_same_pairs(self):
+        whole = score_pairs(self.matrix())
+        with mock.patch("core.collusion.BLOCK_SIZE", 4):
+            blocks = score_pairs(self.matrix())
+
+        for a, b in zip(whole, blocks):
+            np.testing.assert_allclose(a, b, rtol=1e-5)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class ExamCollusionViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.exam = create_exam()
+        create_question(cls.exam)
+        Session.objects.filter(pk=create_session(cls.exam).pk).finalize()
+
+    def setUp(self):
+        self.client.force_login(self.exam.user)
+
+    @mock.patch("core.views.compute_collusion_report.delay")
+    def test_computed_in_the_background(self, delay):
+        url = reverse("exam_collusion", args=[self.exam.pk])
+
+        self.assertContains(self.client.get(url), "is being computed")
+        self.assertContains(self.client.get(url), "is being computed")
+        delay.assert_called_once_with(self.exam.pk)
+
+        compute_collusion_report(self.exam.pk)
+        response = self.client.get(url)
+        self.assertNotContains(response, "is being computed")
+        self.assertEqual(response.context["report"]["num_sessions"], 1)
+
+
+def create_zip(files):
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, "w") as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+    return SimpleUploadedFile("questions.zip", data.getvalue())
+
+
+def create_png():
+    data = io.BytesIO()
+    Image.new("RGB", (1, 1)).save(data, "PNG")
+    return data.getvalue()
+
+
+QUESTION_HEADER = (
+    "question,image,correct_answer,option_A,option_B,option_C,option_D,"
+    "marks_on_correct_answer,marks_on_wrong_answer\n"
+)
+
+
+class ImportQuestionsTests(TestCase):
+    def setUp(self):
+        self.exam = create_exam()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def stored_images(self):
+        return default_storage.listdir("question_images")[1]
+
+    def test_creates_questions_in_a_new_version(self):
+        upload = create_zip(
+            {
+                "questions.csv": QUESTION_HEADER
+                + "First,first.png,B,a,b,c,d,2,\nSecond,,C,a,b,c,d,1,0.5\n",
+                "first.png": create_png(),
+            }
+        )
+
+        questions, errors = import_questions(self.exam, upload)
+
+        self.assertEqual(errors, [])
+        self.exam.refresh_from_db()
+        self.assertEqual(self.exam.version, 2)
+        first, second = self.exam.question_set.order_by("question")
+        self.assertEqual(first.version_added, 2)
+        self.assertEqual(first.marks_on_wrong_answer, 0)
+        self.assertTrue(default_storage.exists(first.image.name))
+        self.assertEqual(second.marks_on_wrong_answer, 0.5)
+
+    def test_errors_of_any_row_create_nothing(self):
+        upload = SimpleUploadedFile(
+            "questions.csv",
+            (QUESTION_HEADER + "First,,A,a,b,c,d,1,0\nSecond,,,a,b,c,d,1,0\n").encode(),
+        )
+
+        questions, errors = import_questions(self.exam, upload)
+
+        self.assertEqual(questions, [])
+        self.assertEqual([line for line, _ in errors], [3])
+        self.assertIn("correct_answer", errors[0][1][0])
+        self.assertFalse(self.exam.question_set.exists())
+
+    @mock.patch("core.imports.MAX_ZIP_SIZE", 100)
+    def test_rejects_zip_larger_than_the_limit_once_extracted(self):
+        upload = create_zip(
+            {"questions.csv": QUESTION_HEADER, "large.png": b"\0" * 101}
+        )
+        with mock.patch("zipfile.ZipFile.read") as read:
+            with self.assertRaisesMessage(ImportFileError, "at most"):
+                import_questions(self.exam, upload)
+        read.assert_not_called()
+
+    @mock.patch("core.imports.MAX_ZIP_ENTRIES", 2)
+    def test_rejects_zip_with_too_many_files(self):
+        upload = create_zip(
+            {"questions.csv": QUESTION_HEADER, "a.png": b"", "b.png": b""}
+        )
+        with self.assertRaisesMessage(ImportFileError, "at most 2 files"):
+            import_questions(self.exam, upload)
+
+    def test_failed_insert_deletes_the_stored_images(self):
+        upload = create_zip(
+            {
+                "questions.csv": QUESTION_HEADER + "First,first.png,A,a,b,c,d,1,0\n",
+                "first.png": create_png(),
+            }
+        )
+        with mock.patch.object(
+            Question.objects, "bulk_create", side_effect=RuntimeError
+        ):
+            with self.assertRaises(RuntimeError):
+                import_questions(self.exam, upload)
+
+        self.assertEqual(self.stored_images(), [])
+        self.assertFalse(self.exam.question_set.exists())
+
+
+class QuestionVersionTests(TestCase):
+    def setUp(self):
+        self.exam = create_exam()
+        self.question = create_question(self.exam)
+        self.client.force_login(self.exam.user)
+
+    def edit(self, text):
+        data = {
+            "question": text,
+            "correct_answer": "A",
+            "option_A": "a",
+            "option_B": "b",
+            "option_C": "c",
+            "option_D": "d",
+            "marks_on_correct_answer": 1,
+            "marks_on_wrong_answer": 0,
+        }
+        return self.client.post(reverse("question_edit", args=[self.question.pk]), data)
+
+    def test_published_once_a_session_is_started_on_its_version(self):
+        self.assertFalse(self.question.is_published())
+        create_session(self.exam)
+        self.assertTrue(self.question.is_published())
+
+        self.exam.bump_version()
+        later = create_question(self.exam, version_added=self.exam.version)
+        self.assertFalse(later.is_published())
+
+    def test_save_revision_replaces_the_question_from_the_version_on(self):
+        pk, created = self.question.pk, self.question.created
+        self.question.question = "Revised"
+
+        self.question.save_revision(2)
+
+        old = Question.objects.get(pk=pk)
+        self.assertEqual((old.question, old.version_removed), ("Question", 2))
+        self.assertNotEqual(self.question.pk, pk)
+        self.assertEqual(self.question.origin_id, pk)
+        self.assertEqual(self.question.version_added, 2)
+        self.assertEqual(Question.objects.get(pk=self.question.pk).created, created)
+        questions = self.exam.question_set.in_version(1)
+        self.assertEqual([q.question for q in questions], ["Question"])
+        questions = self.exam.question_set.in_version(2)
+        self.assertEqual([q.question for q in questions], ["Revised"])
+
+    def test_edit_of_unpublished_question_is_saved_in_place(self):
+        self.edit("Revised")
+
+        self.assertEqual(
+            list(self.exam.question_set.values_list("pk", "question")),
+            [(self.question.pk, "Revised")],
+        )
+
+    def test_edit_of_published_question_keeps_the_session_version(self):
+        session = create_session(self.exam)
+
+        self.edit("Revised")
+
+        self.exam.refresh_from_db()
+        self.assertEqual(self.exam.version, 2)
+        self.assertEqual(
+            Question.objects.get(pk=session.question_ids[0]).question, "Question"
+        )
+        revision = self.exam.question_set.current().get()
+        self.assertEqual(
+            (revision.question, revision.origin_id), ("Revised", self.question.pk)
+        )
+
+    def test_delete_of_published_question_only_removes_it_from_the_version(self):
+        create_session(self.exam)
+        unpublished = create_question(self.exam, "Unpublished", version_added=2)
+
+        for question in (self.question, unpublished):
+            self.client.post(reverse("question_delete", args=[question.pk]))
+
+        self.assertEqual(
+            list(self.exam.question_set.values_list("pk", "version_removed")),
+            [(self.question.pk, 2)],
+        )
+        self.exam.refresh_from_db()
+        self.assertEqual(self.exam.num_questions, 0)
+
+
+class ExamVersionLockTests(TransactionTestCase):
+    def test_bump_version_locks_the_exam_row_sessions_are_started_under(self):
+        exam = create_exam()
+        other = connections.create_connection("default")
+        self.addCleanup(other.close)
+
+        with transaction.atomic():
+            exam.bump_version()
+            with other.cursor() as cursor:
+                with self.assertRaises(DatabaseError):
+                    # the lock exam_start takes to read the version
+                    cursor.execute(
+                        f"SELECT 1 FROM {Exam._meta.db_table} WHERE id = %s "
+                        "FOR UPDATE NOWAIT",
+                        [exam.pk],
+                    )
+
+
+class ApplyAnswerOpsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.exam = create_exam()
+        cls.first = create_question(cls.exam, "First")
+        cls.second = create_question(cls.exam, "Second")
+
+    def setUp(self):
+        self.session = create_session(self.exam)
+        self.session.question_ids = [self.second.pk, self.first.pk]
+        self.session.save()
+
+    def answers(self):
+        return dict(self.session.answer_set.values_list("question_id", "answer"))
+
+    def test_replays_the_ops_in_order(self):
+        Answer.objects.create(session=self.session, question=self.first, answer="A")
+
+        results = apply_answer_ops(
+            self.session,
+            [
+                {"op": "answer", "q_num": 1, "answer": "B"},
+                {"op": "answer", "q_num": 1, "answer": "C"},
+                {"op": "clear", "q_num": 2},
+                {"op": "bookmark", "q_num": 2, "bookmark": True},
+            ],
+        )
+
+        self.assertEqual([result["status"] for result in results], ["ok"] * 4)
+        self.assertEqual(self.answers(), {self.second.pk: "C"})
+        self.assertEqual(list(self.session.bookmarks.all()), [self.first])
+
+    def test_invalid_ops_fail_alone(self):
+        results = apply_answer_ops(
+            self.session,
+            [
+                {"op": "answer", "q_num": 3, "answer": "A"},
+                {"op": "answer", "q_num": "x", "answer": "A"},
+                {"op": "answer", "q_num": 1, "answer": "E"},
+                {"op": "bookmark", "q_num": 1, "bookmark": "yes"},
+                {"op": "unknown", "q_num": 1},
+                "answer",
+                {"op": "answer", "q_num": 2, "answer": "D"},
+            ],
+        )
+
+        self.assertEqual(
+            [result["message"] for result in results],
+            [
+                "Invalid question.",
+                "Invalid question.",
+                "Invalid answer.",
+                "Invalid bookmark.",
+                "Invalid operation.",
+                "Invalid question.",
+                'Answer "D" saved.',
+            ],
+        )
+        self.assertEqual(self.answers(), {self.first.pk: "D"})
+
+    def test_unchanged_answers_are_not_written(self):
+        Answer.objects.create(session=self.session, question=self.first, answer="A")
+        ops = [
+            {"op": "answer", "q_num": 2, "answer": "B"},
+            {"op": "answer", "q_num": 2, "answer": "A"},
+        ]
+        with mock.patch.object(Answer.objects, "upsert") as upsert:
+            apply_answer_ops(self.session, ops)
+        self.assertEqual(list(upsert.call_args[0][0]), [])
+
+
+class AnswerSyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.exam = create_exam()
+        cls.question = create_question(cls.exam)
+
+    def setUp(self):
+        self.session = create_session(self.exam)
+        self.client.force_login(self.session.user)
+        self.url = reverse("answer_sync", args=[self.exam.pk])
+
+    def sync(self, ops):
+        return self.client.post(self.url, {"ops": ops})
+
+    def test_returns_a_result_per_op(self):
+        response = self.sync(
+            json.dumps(
+                [
+                    {"op": "answer", "q_num": 1, "answer": "B"},
+                    {"op": "answer", "q_num": 2, "answer": "B"},
+                ]
+            )
+        )
+
+        self.assertEqual(
+            response.json()["results"],
+            [
+                {"status": "ok", "message": 'Answer "B" saved.'},
+                {"status": "error", "message": "Invalid question."},
+            ],
+        )
+        self.assertEqual(self.session.answer_set.get().answer, "B")
+
+    def test_rejects_malformed_ops(self):
+        for ops in ("not json", json.dumps({"op": "answer"})):
+            response = self.sync(ops)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()["message"], "Invalid operations.")
+
+    def test_rejects_expired_session(self):
+        Session.objects.filter(pk=self.session.pk).update(
+            deadline=timezone.now() - timedelta(seconds=1)
+        )
+
+        response = self.sync(json.dumps([{"op": "answer", "q_num": 1, "answer": "B"}]))
+
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(self.session.answer_set.exists())
+
+
+class ExamFormTests(TestCase):
+    def setUp(self):
+        self.exam = create_exam()
+        now = timezone.localtime()
+        self.data = {
+            "name": "Exam",
+            "duration": "01:00:00",
+            "passing_percentage": 40,
+            "start_time": now.strftime("%Y-%m-%dT%H:%M"),
+            "end_time": (now + timedelta(hours=2)).strftime("%Y-%m-%dT%H:%M"),
+            "show_result": True,
+            "colleges": ["SITRC"],
+            "standards": ["FE", "SE"],
+            "branches": ["COMP"],
+        }
+
+    def test_audience_is_every_combination_of_the_selection(self):
+        form = ExamForm(self.data, instance=self.exam)
+        form.save()
+
+        self.assertEqual(
+            self.exam.get_audience(),
+            {("SITRC", "FE", "COMP"), ("SITRC", "SE", "COMP")},
+        )
+        form = ExamForm(instance=self.exam)
+        self.assertEqual(form.initial["standards"], ["FE", "SE"])
+
+    def test_audience_is_saved_with_save_m2m(self):
+        form = ExamForm({**self.data, "name": "Other"})
+        exam = form.save(commit=False)
+        exam.user = self.exam.user
+        exam.save()
+        self.assertEqual(exam.get_audience(), set())
+
+        form.save_m2m()
+
+        self.assertEqual(len(exam.get_audience()), 2)
+
+    def test_replaces_the_earlier_audience(self):
+        self.exam.set_audience([("SITRC", "TE", "IT")])
+
+        ExamForm(self.data, instance=self.exam).save()
+
+        self.assertNotIn(("SITRC", "TE", "IT"), self.exam.get_audience())
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class RegradeSessionsTests(TestCase):
+    def setUp(self):
+        self.exam = create_exam()
+        Exam.objects.filter(pk=self.exam.pk).update(passing_percentage=50)
+        self.question = create_question(self.exam, "Keyed wrong", correct_answer="A")
+        self.other = create_question(self.exam, "Other", correct_answer="A")
+        self.exam.bump_version()
+        self.question.question = "Revised"
+        self.question.save_revision(self.exam.version)
+
+    def submit(self, username, question_ids, answers):
+        session = create_session(self.exam, username)
+        session.question_ids = question_ids
+        session.save()
+        Answer.objects.bulk_create(
+            Answer(session=session, question_id=question_id, answer=answer)
+            for question_id, answer in zip(question_ids, answers)
+        )
+        Session.objects.filter(pk=session.pk).finalize()
+        return session
+
+    def regrade(self, **fields):
+        return Regrade.objects.create(
+            user=self.exam.user,
+            question=self.question,
+            **{
+                "correct_answer": "B",
+                "marks_on_correct_answer": 1,
+                "marks_on_wrong_answer": 0,
+                **fields,
+            },
+        )
+
+    def test_records_the_scores_before_and_after(self):
+        origin = self.question.origin_id
+        first = self.submit("first", [origin, self.other.pk], ["B", "B"])
+        revised = self.submit("revised", [self.question.pk, self.other.pk], ["A", "A"])
+        untouched = self.submit("untouched", [self.other.pk], ["A"])
+        regrade = self.regrade()
+
+        regrade_sessions(regrade.pk)
+
+        changes = regrade.changes.values_list(
+            "session", "marks_before", "marks_after", "passed_before", "passed_after"
+        )
+        self.assertCountEqual(
+            changes, [(first.pk, 0, 1, False, True), (revised.pk, 2, 1, True, True)]
+        )
+        untouched.refresh_from_db()
+        self.assertEqual(untouched.marks, 1)
+        self.assertEqual(
+            set(Question.objects.filter(exam=self.exam).values_list("correct_answer")),
+            {("B",), ("A",)},
+        )
+        regrade.refresh_from_db()
+        self.exam.refresh_from_db()
+        self.assertEqual(regrade.num_sessions, 2)
+        self.assertEqual(regrade.get_status_display(), "Done")
+        self.assertEqual(self.exam.regraded, regrade.finished)
+
+    def test_stored_scores_match_a_fresh_grade(self):
+        self.submit("first", [self.question.origin_id, self.other.pk], ["B", "C"])
+        regrade_sessions(self.regrade(marks_on_correct_answer=3).pk)
+
+        scores = list(Session.objects.values_list("marks", "max_marks", "passed"))
+        Session.objects.all().grade()
+        self.assertEqual(
+            scores, list(Session.objects.values_list("marks", "max_marks", "passed"))
+        )
+        self.assertEqual(scores, [(3, 4, True)])
+
+    def test_finished_regrade_is_not_applied_again(self):
+        session = self.submit("first", [self.question.pk], ["B"])
+        regrade = self.regrade()
+        regrade_sessions(regrade.pk)
+
+        regrade_sessions(regrade.pk)
+
+        self.assertEqual(regrade.changes.get().session, session)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class GetOrComputeTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_concurrent_misses_compute_once(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return "value"
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(get_or_compute("key", compute, 60))
+            )
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ["value"] * 8)
+        self.assertEqual(len(calls), 1)
+        self.assertIsNone(cache.get("key:lock"))
+
+    def test_waiter_computes_itself_once_the_lock_timed_out(self):
+        cache.add("key:lock", "other", 60)
+
+        value = get_or_compute("key", lambda: "value", 60, lock_timeout=0.1)
+
+        self.assertEqual(value, "value")
+        self.assertEqual(cache.get("key:lock"), "other")
+
+    def test_lock_taken_over_is_not_released(self):
+        def compute():
+            # the lock expired and another caller took it
+            cache.set("key:lock", "other", 60)
+            return "value"
+
+        self.assertEqual(get_or_compute("key", compute, 60), "value")
+        self.assertEqual(cache.get("key:lock"), "other")
+        self.assertEqual(cache.get("key"), "value")
+
+    def test_timeout_can_depend_on_the_value(self):
+        with mock.patch("core.cache.cache.set", wraps=cache.set) as set_:
+            get_or_compute("key", lambda: {"seconds": 7}, lambda v: v["seconds"])
+        set_.assert_called_once_with("key", {"seconds": 7}, 7)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class ExamPaperTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.exam = create_exam()
+        self.first = create_question(self.exam, "First")
+        self.second = create_question(self.exam, "Second")
+        self.session = create_session(self.exam)
+        self.session.question_ids = [self.second.pk, self.first.pk]
+        self.session.save()
+        self.client.force_login(self.session.user)
+        self.url = reverse("exam_paper", args=[self.exam.pk])
+
+    def test_paper_of_the_session_version_in_its_order(self):
+        Answer.objects.create(session=self.session, question=self.first, answer="C")
+        self.exam.bump_version()
+        self.first.question = "Revised"
+        self.first.save_revision(self.exam.version)
+
+        paper = self.client.get(self.url).json()
+
+        self.assertEqual(paper["version"], 1)
+        self.assertEqual(
+            [question["question"] for question in paper["questions"]],
+            ["Second", "First"],
+        )
+        self.assertEqual(paper["answers"], [None, "C"])
+        self.assertEqual(paper["bookmarks"], [False, False])
+
+    def test_not_modified_until_the_answers_change(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Answer.objects.create(session=self.session, question=self.first, answer="C")
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
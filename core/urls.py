@@ -5,6 +5,12 @@ urlpatterns = [
     path("teachers/exams/", exams_list, name="exams_list"),
     path("teachers/exams/create/", exam_create, name="exam_create"),
     path("teachers/exams/<int:pk>/", exam_detail, name="exam_detail"),
+    path(
+        "teachers/exams/<int:pk>/analysis/", exam_analysis, name="exam_analysis"
+    ),
+    path(
+        "teachers/exams/<int:pk>/collusion/", exam_collusion, name="exam_collusion"
+    ),
     path("teachers/exams/<int:pk>/edit/", exam_edit, name="exam_edit"),
     path("teachers/exams/<int:pk>/delete/", exam_delete, name="exam_delete"),
     path(
@@ -12,11 +18,27 @@ urlpatterns = [
         question_create,
         name="question_create",
     ),
+    path(
+        "teachers/exams/<int:exam_pk>/question-import/",
+        question_import,
+        name="question_import",
+    ),
     path(
         "teachers/questions/<int:pk>/edit/",
         question_edit,
         name="question_edit",
     ),
+    path(
+        "teachers/questions/<int:pk>/regrade/",
+        question_regrade,
+        name="question_regrade",
+    ),
+    path(
+        "teachers/exams/<int:exam_pk>/regrades/",
+        regrade_list,
+        name="regrade_list",
+    ),
+    path("teachers/regrades/<int:pk>/", regrade_detail, name="regrade_detail"),
     path(
         "teachers/questions/<int:pk>/delete/",
         question_delete,
@@ -43,5 +65,7 @@ urlpatterns = [
         question_list,
         name="question_list",
     ),
+    path("students/exams/<int:exam_pk>/paper/", exam_paper, name="exam_paper"),
     path("students/exams/<int:exam_pk>/bookmark/", bookmark, name="bookmark"),
+    path("students/exams/<int:exam_pk>/sync/", answer_sync, name="answer_sync"),
 ]
@@ -1,16 +1,36 @@
+import hashlib
+import json
 import random
+from django.db import transaction
+from django.db.models import F
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth import logout
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied, ObjectDoesNotExist
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.http import JsonResponse
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
 from django.views.decorators.http import require_POST
 from .decorators import *
-from .forms import ExamForm, QuestionForm
-from .models import Exam, Question, Answer, Session
+from .analytics import item_analysis_key
+from .cache import get_or_schedule, timestamp
+from .collusion import collusion_report_key
+from .forms import ExamForm, QuestionForm, QuestionImportForm, RegradeForm
+from .imports import ImportFileError, import_questions
+from .models import (
+    ANSWER_CHOICES,
+    SYNC_GRACE_PERIOD,
+    Exam,
+    Question,
+    Answer,
+    Regrade,
+    Session,
+)
+from .pagination import paginate
+from .search import full_text_search
+from .tasks import compute_collusion_report, compute_item_analysis, regrade_sessions
 
 
 @login_required
@@ -18,18 +38,11 @@ from .models import Exam, Question, Answer, Session
 def exams_list(request):
     search = request.GET.get("search", None)
     if search:
-        exams = request.user.exam_set.filter(name__icontains=search)
+        exams = full_text_search(request.user.exam_set.all(), search)
     else:
         exams = request.user.exam_set.all()
 
-    paginator = Paginator(exams, 15)
-    page = request.GET.get("page")
-    try:
-        exams = paginator.page(page)
-    except PageNotAnInteger:
-        exams = paginator.page(1)
-    except EmptyPage:
-        exams = paginator.page(paginator.num_pages)
+    exams = paginate(request, exams)
 
     return render(request, "core/exams_list.html", {"exams": exams})
 
@@ -42,13 +55,18 @@ def exam_create(request):
         if form.is_valid():
             exam = form.save(commit=False)
             exam.user = request.user
-            exam.save()
+            with transaction.atomic():
+                exam.save()
+                form.save_m2m()
 
             messages.success(request, f'Exam "{exam}" created successfully.')
 
             return redirect("exam_detail", pk=exam.pk)
     else:
-        form = ExamForm()
+        teacher = request.user.teacher
+        form = ExamForm(
+            initial={"colleges": [teacher.college], "branches": [teacher.branch]}
+        )
 
     return render(request, "core/exam_create.html", {"form": form})
 
@@ -62,23 +80,45 @@ def exam_detail(request, pk):
 
     search = request.GET.get("search", None)
     if search:
-        questions = exam.question_set.filter(deleted=None, question__icontains=search)
+        questions = full_text_search(exam.question_set.current(), search)
     else:
-        questions = exam.question_set.filter(deleted=None)
+        questions = exam.question_set.current()
 
-    paginator = Paginator(questions, 15)
-    page = request.GET.get("page")
-    try:
-        questions = paginator.page(page)
-    except PageNotAnInteger:
-        questions = paginator.page(1)
-    except EmptyPage:
-        questions = paginator.page(paginator.num_pages)
+    questions = paginate(request, questions)
 
     context = {"exam": exam, "questions": questions}
     return render(request, "core/exam_detail.html", context)
 
 
+@login_required
+@is_verified_teacher
+def exam_analysis(request, pk):
+    exam = get_object_or_404(Exam, pk=pk)
+    if exam.user != request.user:
+        raise PermissionDenied()
+
+    # computed by a worker on a miss, the page shows it is pending meanwhile
+    analysis = get_or_schedule(
+        item_analysis_key(exam), lambda: compute_item_analysis.delay(exam.pk)
+    )
+    context = {"exam": exam, "analysis": analysis}
+    return render(request, "core/exam_analysis.html", context)
+
+
+@login_required
+@is_verified_teacher
+def exam_collusion(request, pk):
+    exam = get_object_or_404(Exam, pk=pk)
+    if exam.user != request.user:
+        raise PermissionDenied()
+
+    report = get_or_schedule(
+        collusion_report_key(exam), lambda: compute_collusion_report.delay(exam.pk)
+    )
+    context = {"exam": exam, "report": report}
+    return render(request, "core/exam_collusion.html", context)
+
+
 @login_required
 @is_verified_teacher
 def exam_edit(request, pk):
@@ -89,7 +129,8 @@ def exam_edit(request, pk):
     if request.method == "POST":
         form = ExamForm(request.POST, instance=exam)
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                form.save()
 
             messages.success(request, f'Exam "{exam}" saved successfully.')
 
@@ -127,7 +168,11 @@ def question_create(request, exam_pk):
         if form.is_valid():
             question = form.save(commit=False)
             question.exam = exam
-            question.save()
+            with transaction.atomic():
+                exam.bump_version()
+                question.version_added = exam.version
+                question.save()
+                exam.update_question_counters()
 
             messages.success(request, f'Question "{question}" created successfully.')
 
@@ -139,17 +184,52 @@ def question_create(request, exam_pk):
     return render(request, "core/question_create.html", context)
 
 
+@login_required
+@is_verified_teacher
+def question_import(request, exam_pk):
+    exam = get_object_or_404(Exam, pk=exam_pk)
+    if exam.user != request.user:
+        raise PermissionDenied()
+
+    errors = []
+    if request.method == "POST":
+        form = QuestionImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            try:
+                questions, errors = import_questions(exam, form.cleaned_data["file"])
+            except ImportFileError as e:
+                form.add_error("file", str(e))
+            else:
+                if not errors:
+                    messages.success(
+                        request, f"{len(questions)} questions imported successfully."
+                    )
+                    return redirect("exam_detail", pk=exam.pk)
+    else:
+        form = QuestionImportForm()
+
+    context = {"form": form, "errors": errors, "exam_pk": exam_pk}
+    return render(request, "core/question_import.html", context)
+
+
 @login_required
 @is_verified_teacher
 def question_edit(request, pk):
-    question = get_object_or_404(Question, pk=pk)
+    question = get_object_or_404(Question, pk=pk, version_removed=None)
     if question.exam.user != request.user:
         raise PermissionDenied()
 
     if request.method == "POST":
         form = QuestionForm(request.POST, request.FILES, instance=question)
         if form.is_valid():
-            form.save()
+            question = form.save(commit=False)
+            with transaction.atomic():
+                question.exam.bump_version()
+                if question.is_published():
+                    question.save_revision(question.exam.version)
+                else:
+                    question.save()
+                question.exam.update_question_counters()
 
             messages.success(request, f'Question "{question}" saved successfully.')
 
@@ -161,20 +241,85 @@ def question_edit(request, pk):
     return render(request, "core/question_edit.html", context)
 
 
+@login_required
+@is_verified_teacher
+def question_regrade(request, pk):
+    question = get_object_or_404(Question, pk=pk, version_removed=None)
+    if question.exam.user != request.user:
+        raise PermissionDenied()
+
+    if request.method == "POST":
+        form = RegradeForm(request.POST)
+        if form.is_valid():
+            regrade = form.save(commit=False)
+            regrade.user = request.user
+            regrade.question = question
+            regrade.save()
+            transaction.on_commit(lambda: regrade_sessions.delay(regrade.pk))
+
+            messages.success(request, f'Regrade of "{question}" started.')
+
+            return redirect("regrade_detail", pk=regrade.pk)
+    else:
+        form = RegradeForm(
+            initial={
+                "correct_answer": question.correct_answer,
+                "marks_on_correct_answer": question.marks_on_correct_answer,
+                "marks_on_wrong_answer": question.marks_on_wrong_answer,
+            }
+        )
+
+    context = {"form": form, "question": question}
+    return render(request, "core/question_regrade.html", context)
+
+
+@login_required
+@is_verified_teacher
+def regrade_list(request, exam_pk):
+    exam = get_object_or_404(Exam, pk=exam_pk)
+    if exam.user != request.user:
+        raise PermissionDenied()
+    regrades = Regrade.objects.filter(question__exam=exam).select_related("question")
+
+    regrades = paginate(request, regrades)
+
+    context = {"exam": exam, "regrades": regrades}
+    return render(request, "core/regrade_list.html", context)
+
+
+@login_required
+@is_verified_teacher
+def regrade_detail(request, pk):
+    regrade = get_object_or_404(Regrade.objects.select_related("question__exam"), pk=pk)
+    if regrade.question.exam.user != request.user:
+        raise PermissionDenied()
+    changes = regrade.changes.select_related("session__student")
+    if request.GET.get("changed", None):
+        changes = changes.exclude(marks_before=F("marks_after"))
+
+    changes = paginate(request, changes)
+
+    context = {"regrade": regrade, "changes": changes}
+    return render(request, "core/regrade_detail.html", context)
+
+
 @require_POST
 @login_required
 @is_verified_teacher
 def question_delete(request, pk):
-    question = get_object_or_404(Question, pk=pk)
+    question = get_object_or_404(Question, pk=pk, version_removed=None)
     if question.exam.user != request.user:
         raise PermissionDenied()
 
     exam = question.exam
-    if Session.objects.filter(exam=exam, created__gt=question.created).exists():
-        question.deleted = timezone.now()
-        question.save()
-    else:
-        question.delete()
+    with transaction.atomic():
+        exam.bump_version()
+        if question.is_published():
+            question.version_removed = exam.version
+            question.save(update_fields=["version_removed"])
+        else:
+            question.delete()
+        exam.update_question_counters()
 
     messages.success(request, "Question deleted successfully")
     return redirect("exam_detail", pk=exam.pk)
@@ -184,38 +329,36 @@ def question_delete(request, pk):
 @is_verified_student
 def exam_start(request, exam_pk):
     session = get_object_or_404(
-        Session, user=request.user, exam__pk=exam_pk, completed=False
+        Session.objects.select_related("exam"),
+        user=request.user,
+        exam__pk=exam_pk,
+        completed=False,
     )
-    questions = session.get_questions()
 
     # send question on ajax
     if request.is_ajax():
         q_num = int(request.GET.get("question"))
-        question = questions[q_num - 1]
+        question = session.get_question(q_num)
+        num_questions = session.get_num_total_que()
 
         try:
             answer = Answer.objects.get(session=session, question=question)
             answer = answer.answer
         except ObjectDoesNotExist:
             answer = None
+        bookmark = session.bookmarks.filter(id=question.id).exists()
 
         prev_q_num = q_num - 1 if q_num > 1 else None
-        next_q_num = q_num + 1 if q_num < len(questions) else None
+        next_q_num = q_num + 1 if q_num < num_questions else None
 
         return JsonResponse(
             {
                 "q_num": q_num,
                 "prev_q_num": prev_q_num,
                 "next_q_num": next_q_num,
-                "question": question.question,
-                "image_url": question.image.url if question.image else None,
-                "option_A": question.option_A,
-                "option_B": question.option_B,
-                "option_C": question.option_C,
-                "option_D": question.option_D,
                 "answer": answer,
-                "marks_on_correct_answer": question.marks_on_correct_answer,
-                "marks_on_wrong_answer": question.marks_on_wrong_answer,
+                "bookmark": bookmark,
+                **session.get_payload_map()[question.pk],
             }
         )
 
@@ -227,16 +370,111 @@ def exam_start(request, exam_pk):
     return render(request, "core/exam_start.html", context)
 
 
+def apply_answer_ops(session, ops):
+    valid_answers = {choice for choice, _ in ANSWER_CHOICES}
+    Bookmark = Session.bookmarks.through
+
+    with transaction.atomic():
+        # serialize concurrent syncs of the same session
+        Session.objects.select_for_update().only("pk").get(pk=session.pk)
+
+        # replay the ops in order against the current state, then write the
+        # difference in bulk
+        answers = dict(session.answer_set.values_list("question_id", "answer"))
+        bookmarks = set(session.bookmarks.values_list("id", flat=True))
+        old_answers = dict(answers)
+        old_bookmarks = set(bookmarks)
+
+        results = []
+        for op in ops:
+            try:
+                q_num = int(op.get("q_num"))
+                if not 1 <= q_num <= len(session.question_ids):
+                    raise ValueError()
+            except (AttributeError, TypeError, ValueError):
+                results.append({"status": "error", "message": "Invalid question."})
+                continue
+            question_id = session.question_ids[q_num - 1]
+
+            if op.get("op") == "answer":
+                ans = op.get("answer")
+                if ans not in valid_answers:
+                    results.append({"status": "error", "message": "Invalid answer."})
+                    continue
+                answers[question_id] = ans
+                msg = f'Answer "{ans}" saved.'
+            elif op.get("op") == "clear":
+                answers.pop(question_id, None)
+                msg = "Answer cleared."
+            elif op.get("op") == "bookmark":
+                if not isinstance(op.get("bookmark"), bool):
+                    results.append({"status": "error", "message": "Invalid bookmark."})
+                    continue
+                if op["bookmark"]:
+                    bookmarks.add(question_id)
+                    msg = "Bookmark added."
+                else:
+                    bookmarks.discard(question_id)
+                    msg = "Bookmark removed."
+            else:
+                results.append({"status": "error", "message": "Invalid operation."})
+                continue
+
+            results.append({"status": "ok", "message": msg})
+
+        changed = [
+            question_id
+            for question_id in answers.keys() | old_answers.keys()
+            if answers.get(question_id) != old_answers.get(question_id)
+        ]
+        cleared = [pk for pk in changed if pk not in answers]
+        if cleared:
+            session.answer_set.filter(question_id__in=cleared).delete()
+        Answer.objects.upsert(
+            Answer(session=session, question_id=pk, answer=answers[pk])
+            for pk in changed
+            if pk in answers
+        )
+
+        removed = old_bookmarks - bookmarks
+        if removed:
+            Bookmark.objects.filter(session=session, question_id__in=removed).delete()
+        added = bookmarks - old_bookmarks
+        if added:
+            Bookmark.objects.bulk_create(
+                [Bookmark(session=session, question_id=pk) for pk in added]
+            )
+
+    return results
+
+
+def load_answer_ops(request):
+    try:
+        ops = json.loads(request.POST.get("ops") or "[]")
+    except ValueError:
+        return None
+    return ops if isinstance(ops, list) else None
+
+
 @require_POST
 @login_required
 @is_verified_student
 def exam_submit(request, exam_pk):
-    session = get_object_or_404(
-        Session, user=request.user, exam__pk=exam_pk, completed=False
-    )
-    session.completed = True
-    session.submitted = timezone.now()
-    session.save()
+    session = get_object_or_404(Session, user=request.user, exam__pk=exam_pk)
+    # a session finalized meanwhile (by the expiry task or an earlier submit)
+    # shows its result
+    if not session.completed:
+        # changes the client had not synced yet when the exam was submitted
+        ops = load_answer_ops(request)
+        with transaction.atomic():
+            session = Session.objects.select_for_update().get(pk=session.pk)
+            if not session.completed:
+                if ops and timezone.now() <= session.deadline + SYNC_GRACE_PERIOD:
+                    apply_answer_ops(session, ops)
+                Session.objects.filter(pk=session.pk).finalize(
+                    submitted=timezone.now()
+                )
+        session.refresh_from_db()
 
     return render(request, "core/submit.html", {"session": session})
 
@@ -246,16 +484,17 @@ def exam_submit(request, exam_pk):
 @is_verified_student
 def answer_clear(request, exam_pk):
     session = get_object_or_404(
-        Session, user=request.user, exam__pk=exam_pk, completed=False
+        Session.objects.with_expired().select_related("exam"),
+        user=request.user,
+        exam__pk=exam_pk,
+        completed=False,
     )
-    if timezone.now().timestamp() > session.get_timeover_timestamp():
+    if session.expired:
         raise PermissionDenied()
-    questions = session.get_questions()
-
     q_num = int(request.POST.get("q_num"))
-    question = questions[q_num - 1]
+    question = session.get_question(q_num)
 
-    Answer.objects.get(session=session, question=question).delete()
+    Answer.objects.filter(session=session, question=question).delete()
 
     return JsonResponse({"status": "ok", "message": "Answer cleared."})
 
@@ -265,18 +504,21 @@ def answer_clear(request, exam_pk):
 @is_verified_student
 def answer_submit(request, exam_pk):
     session = get_object_or_404(
-        Session, user=request.user, exam__pk=exam_pk, completed=False
+        Session.objects.with_expired().select_related("exam"),
+        user=request.user,
+        exam__pk=exam_pk,
+        completed=False,
     )
-    if timezone.now().timestamp() > session.get_timeover_timestamp():
+    if session.expired:
         raise PermissionDenied()
-    questions = session.get_questions()
     q_num = int(request.POST.get("q_num"))
     ans = request.POST.get("answer")
-    question = questions[q_num - 1]
+    question = session.get_question(q_num)
 
-    Answer.objects.update_or_create(
-        session=session, question=question, defaults={"answer": ans}
-    )
+    if ans not in {choice for choice, _ in ANSWER_CHOICES}:
+        return JsonResponse({"status": "error", "message": "Invalid answer."})
+
+    Answer.objects.upsert([Answer(session=session, question=question, answer=ans)])
 
     return JsonResponse({"status": "ok", "message": f'Answer "{ans}" saved.'})
 
@@ -287,24 +529,64 @@ def question_list(request, exam_pk):
     session = get_object_or_404(
         Session, user=request.user, exam__pk=exam_pk, completed=False
     )
-    questions = session.get_questions()
+    answers = dict(session.answer_set.values_list("question_id", "answer"))
+    bookmarks = set(session.bookmarks.values_list("id", flat=True))
 
     data = []
-    for question in questions:
-        try:
-            answer = Answer.objects.get(session=session, question=question)
-            answer = answer.answer
-        except ObjectDoesNotExist:
-            answer = None
+    for question_id in session.question_ids:
+        data.append(
+            {
+                "answer": answers.get(question_id),
+                "bookmark": question_id in bookmarks,
+            }
+        )
 
-        if session.bookmarks.filter(id=question.id).exists():
-            bookmark = True
-        else:
-            bookmark = False
+    return JsonResponse({"questions": data})
 
-        data.append({"answer": answer, "bookmark": bookmark})
 
-    return JsonResponse({"questions": data})
+@login_required
+@is_verified_student
+def exam_paper(request, exam_pk):
+    session = get_object_or_404(
+        Session.objects.select_related("exam"),
+        user=request.user,
+        exam__pk=exam_pk,
+        completed=False,
+    )
+    answers = dict(session.answer_set.values_list("question_id", "answer"))
+    bookmarks = set(session.bookmarks.values_list("id", flat=True))
+    answers = [answers.get(pk) for pk in session.question_ids]
+    bookmarks = [pk in bookmarks for pk in session.question_ids]
+
+    # the paper of a session only changes with a regrade (the marks), the
+    # answers and bookmarks only with the student's own writes
+    etag = hashlib.md5(
+        json.dumps(
+            [
+                session.pk,
+                session.exam_version,
+                timestamp(session.exam.regraded),
+                answers,
+                bookmarks,
+            ]
+        ).encode()
+    ).hexdigest()
+    etag = quote_etag(etag)
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(
+            {
+                "version": session.exam_version,
+                "questions": session.get_payloads(),
+                "answers": answers,
+                "bookmarks": bookmarks,
+            }
+        )
+    response["ETag"] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+
+    return response
 
 
 @require_POST
@@ -312,11 +594,13 @@ def question_list(request, exam_pk):
 @is_verified_student
 def bookmark(request, exam_pk):
     session = get_object_or_404(
-        Session, user=request.user, exam__pk=exam_pk, completed=False
+        Session.objects.select_related("exam"),
+        user=request.user,
+        exam__pk=exam_pk,
+        completed=False,
     )
-    questions = session.get_questions()
     q_num = int(request.POST.get("q_num"))
-    question = questions[q_num - 1]
+    question = session.get_question(q_num)
 
     if session.bookmarks.filter(id=question.id).exists():
         session.bookmarks.remove(question)
@@ -326,3 +610,25 @@ def bookmark(request, exam_pk):
         msg = "Bookmark added."
 
     return JsonResponse({"status": "ok", "message": msg})
+
+
+@require_POST
+@login_required
+@is_verified_student
+def answer_sync(request, exam_pk):
+    session = get_object_or_404(
+        Session.objects.with_expired(),
+        user=request.user,
+        exam__pk=exam_pk,
+        completed=False,
+    )
+    if session.expired:
+        raise PermissionDenied()
+
+    ops = load_answer_ops(request)
+    if ops is None:
+        return JsonResponse(
+            {"status": "error", "message": "Invalid operations."}, status=400
+        )
+
+    return JsonResponse({"status": "ok", "results": apply_answer_ops(session, ops)})
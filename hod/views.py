@@ -2,12 +2,12 @@ from django.contrib import messages
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from django.db.models import Q
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views.decorators.http import require_POST
 from core.decorators import *
+from core.pagination import paginate
 from users.models import Teacher, TeacherRequest
+from users.search import user_search
 
 User = get_user_model()
 
@@ -17,20 +17,11 @@ User = get_user_model()
 def teachers_list(request):
     search = request.GET.get("search", None)
     if search:
-        teachers = User.objects.exclude(teacher=None).filter(
-            Q(username__icontains=search) | Q(email__icontains=search)
-        )
+        teachers = User.objects.exclude(teacher=None).filter(user_search(search))
     else:
         teachers = User.objects.exclude(teacher=None)
 
-    paginator = Paginator(teachers, 15)
-    page = request.GET.get("page")
-    try:
-        teachers = paginator.page(page)
-    except PageNotAnInteger:
-        teachers = paginator.page(1)
-    except EmptyPage:
-        teachers = paginator.page(paginator.num_pages)
+    teachers = paginate(request, teachers, count=True)
 
     return render(request, "hod/teachers_list.html", {"teachers": teachers})
 
@@ -51,20 +42,11 @@ def teacher_delete(request, pk):
 def teachers_request_list(request):
     search = request.GET.get("search", None)
     if search:
-        teachers = User.objects.exclude(teacherrequest=None).filter(
-            Q(username__icontains=search) | Q(email__icontains=search)
-        )
+        teachers = User.objects.exclude(teacherrequest=None).filter(user_search(search))
     else:
         teachers = User.objects.exclude(teacherrequest=None)
 
-    paginator = Paginator(teachers, 15)
-    page = request.GET.get("page")
-    try:
-        teachers = paginator.page(page)
-    except PageNotAnInteger:
-        teachers = paginator.page(1)
-    except EmptyPage:
-        teachers = paginator.page(paginator.num_pages)
+    teachers = paginate(request, teachers, count=True)
 
     return render(request, "hod/teachers_request_list.html", {"teachers": teachers})
 
@@ -41,6 +41,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "crispy_forms",
     "core.apps.CoreConfig",
     "users.apps.UsersConfig",
@@ -104,6 +105,19 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+# shared by the web processes and the celery workers, which clear and warm
+# the entries the web processes read
+CACHES = {
+    "default": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": os.getenv("CACHE_URL", "redis://localhost:6379/1"),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -169,3 +183,24 @@ EMAIL_HOST_USER = os.environ.get("EMAIL_USER")
 EMAIL_HOST_PASSWORD = os.environ.get("EMAIL_PASS")
 
 LOGIN_REDIRECT_URL = "redirect_on_login"
+
+
+# Celery
+# https://docs.celeryproject.org/en/stable/django/first-steps-with-django.html
+
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "amqp://localhost")
+CELERY_TIMEZONE = TIME_ZONE
+
+CELERY_BEAT_SCHEDULE = {
+    "finalize-expired-sessions": {
+        "task": "core.tasks.finalize_expired_sessions",
+        "schedule": 60,
+    },
+    "warm-exam-caches": {
+        "task": "core.tasks.warm_exam_caches",
+        "schedule": 60,
+    },
+}
+
+# seconds before an exam starts that its questions are loaded into the cache
+EXAM_WARMUP_LEAD_TIME = int(os.getenv("EXAM_WARMUP_LEAD_TIME", 15 * 60))
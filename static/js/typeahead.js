@@ -0,0 +1,47 @@
+jQuery_3_6_0(document).ready(function () {
+    const DEBOUNCE_DELAY = 250;
+    const MIN_LENGTH = 2;
+
+    jQuery_3_6_0(".js-typeahead").each(function () {
+        const $input = jQuery_3_6_0(this);
+        const $list = jQuery_3_6_0("#" + $input.attr("list"));
+        const url = $input.attr("data-typeahead-url");
+        let timer = null;
+        let request = null;
+
+        $input.on("input", function () {
+            clearTimeout(timer);
+            const query = $input.val().trim();
+            if (query.length < MIN_LENGTH) {
+                $list.empty();
+                return;
+            }
+
+            timer = setTimeout(function () {
+                // only the answer to the latest query is shown
+                if (request) {
+                    request.abort();
+                }
+                request = jQuery_3_6_0.ajax({
+                    type: "GET",
+                    url: url,
+                    data: { q: query },
+                    success: function (data) {
+                        $list.empty();
+                        for (const result of data.results) {
+                            $list.append(
+                                jQuery_3_6_0("<option>").attr("value", result.value).text(result.label)
+                            );
+                        }
+                    },
+                    error: function (data) {
+                        if (data.statusText != "abort") {
+                            console.error("FAILED TO GET SUGGESTIONS");
+                            console.error(data);
+                        }
+                    },
+                });
+            }, DEBOUNCE_DELAY);
+        });
+    });
+});
@@ -1,3 +1,164 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from core.models import Exam, Question, Session, get_open_exams_for
+from users.models import Student, Teacher, User
 
-# Create your tests here.
+
+def create_student(username="student", **fields):
+    user = User.objects.create_user(username, password="pw", is_student=True)
+    return Student.objects.create(
+        user=user,
+        full_name=username,
+        email=f"{username}@example.com",
+        phone="1234567890",
+        **fields,
+    )
+
+
+def create_exam(audience=(("SITRC", "FE", "COMP"),), name="Exam", starts_in=None):
+    user, _ = User.objects.get_or_create(username="teacher", is_teacher=True)
+    Teacher.objects.get_or_create(user=user)
+    start_time = timezone.now() + (starts_in or -timedelta(hours=1))
+    exam = Exam.objects.create(
+        user=user,
+        name=name,
+        start_time=start_time,
+        end_time=start_time + timedelta(hours=2),
+        show_result=True,
+    )
+    exam.set_audience(audience)
+    return exam
+
+
+def create_question(exam, text, **fields):
+    return Question.objects.create(
+        exam=exam,
+        question=text,
+        option_A="a",
+        option_B="b",
+        option_C="c",
+        option_D="d",
+        correct_answer="A",
+        **fields,
+    )
+
+
+class ExamStartTests(TestCase):
+    def setUp(self):
+        self.exam = create_exam()
+        self.student = create_student()
+        self.client.force_login(self.student.user)
+
+    def start(self):
+        return self.client.post(reverse("students:exam_start", args=[self.exam.pk]))
+
+    def test_session_is_pinned_to_the_current_version(self):
+        removed = create_question(self.exam, "Removed", version_removed=2)
+        kept = create_question(self.exam, "Kept")
+        self.exam.bump_version()
+        added = create_question(self.exam, "Added", version_added=2)
+
+        self.start()
+
+        session = Session.objects.get(user=self.student.user)
+        self.assertEqual(session.exam_version, 2)
+        self.assertEqual(sorted(session.question_ids), [kept.pk, added.pk])
+        self.assertNotIn(removed.pk, session.question_ids)
+
+    def test_started_session_keeps_its_version(self):
+        create_question(self.exam, "First")
+        self.start()
+        self.exam.bump_version()
+        create_question(self.exam, "Second", version_added=2)
+
+        self.start()
+
+        session = Session.objects.get(user=self.student.user)
+        self.assertEqual((session.exam_version, len(session.question_ids)), (1, 1))
+
+    def test_exam_without_questions_can_not_be_started(self):
+        self.assertEqual(self.start().status_code, 403)
+        self.assertFalse(Session.objects.exists())
+
+
+class ExamEligibilityTests(TestCase):
+    def setUp(self):
+        self.exam = create_exam(
+            audience=[("SITRC", "FE", "COMP"), ("SITRC", "SE", "IT")]
+        )
+        create_question(self.exam, "Question")
+
+    def test_only_students_of_the_audience_are_eligible(self):
+        for fields, eligible in (
+            ({"standard": "FE", "branch": "COMP"}, True),
+            ({"standard": "SE", "branch": "IT"}, True),
+            ({"standard": "SE", "branch": "COMP"}, False),
+            ({"standard": "FE", "branch": "IT"}, False),
+        ):
+            username = "{standard}-{branch}".format(**fields)
+            student = create_student(username, **fields)
+            with self.subTest(**fields):
+                self.assertEqual(self.exam.is_eligible(student), eligible)
+
+    def test_other_students_can_not_start_the_exam(self):
+        student = create_student(standard="SE", branch="COMP")
+        self.client.force_login(student.user)
+
+        response = self.client.post(reverse("students:exam_start", args=[self.exam.pk]))
+
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Session.objects.exists())
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class OpenExamsCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.exam = create_exam()
+        create_question(self.exam, "Question")
+        Exam.objects.filter(pk=self.exam.pk).update_question_counters()
+        self.student = create_student()
+
+    def test_lists_the_open_exams_of_the_students_audience(self):
+        other = create_exam(audience=[("SITRC", "SE", "IT")], name="Other")
+        create_question(other, "Question")
+        # no questions
+        create_exam(name="Empty")
+        Exam.objects.update_question_counters()
+
+        self.assertEqual(get_open_exams_for(self.student), [self.exam])
+
+    def test_served_from_the_cache(self):
+        get_open_exams_for(self.student)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_open_exams_for(self.student), [self.exam])
+
+    def test_cleared_when_an_exam_or_its_audience_changes(self):
+        get_open_exams_for(self.student)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.exam.set_audience([("SITRC", "SE", "IT")])
+        self.assertEqual(get_open_exams_for(self.student), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.exam.set_audience([("SITRC", "FE", "COMP")])
+            self.exam.end_time = timezone.now() - timedelta(minutes=1)
+            self.exam.save()
+        self.assertEqual(get_open_exams_for(self.student), [])
+
+    def test_expires_when_the_next_exam_starts(self):
+        upcoming = create_exam(name="Upcoming", starts_in=timedelta(minutes=2))
+        create_question(upcoming, "Question")
+        Exam.objects.update_question_counters()
+
+        with mock.patch("core.cache.cache.set", wraps=cache.set) as set_:
+            get_open_exams_for(self.student)
+
+        timeout = set_.call_args[0][2]
+        self.assertTrue(110 < timeout <= 120)
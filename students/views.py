@@ -1,35 +1,25 @@
 import random
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from django.db.models import Count, Q
+from django.db import transaction
 from django.shortcuts import render, redirect, get_object_or_404
 from django.utils import timezone
 from django.views.decorators.http import require_POST
 from core.decorators import *
-from core.models import Exam, Session
+from core.pagination import paginate, paginate_list
+from core.models import Exam, Session, get_open_exams_for
+from core.search import full_text_search
 
 
 @login_required
 @is_verified_student
 def exams_list(request):
     search = request.GET.get("search", None)
-    ques = Count("question", filter=Q(question__deleted=None))
-    now = timezone.now()
-    exams = Exam.objects.annotate(ques=ques).filter(
-        ques__gt=0, start_time__lte=now, end_time__gte=now
-    )
     if search:
-        exams = exams.filter(name__icontains=search)
-
-    paginator = Paginator(exams, 15)
-    page = request.GET.get("page")
-    try:
-        exams = paginator.page(page)
-    except PageNotAnInteger:
-        exams = paginator.page(1)
-    except EmptyPage:
-        exams = paginator.page(paginator.num_pages)
+        exams = Exam.objects.for_student(request.user.student).open(timezone.now())
+        exams = paginate(request, full_text_search(exams, search))
+    else:
+        exams = paginate_list(request, get_open_exams_for(request.user.student))
 
     return render(request, "students/exams_list.html", {"exams": exams})
 
@@ -42,22 +32,36 @@ def exam_start(request, pk):
     now = timezone.now()
     if exam.start_time > now or exam.end_time < now:
         raise PermissionDenied()
+    if not exam.is_eligible(request.user.student):
+        raise PermissionDenied()
 
-    if request.user.session_set.filter(exam=exam, completed=True).exists():
-        messages.error(request, "An exam can only be taken once.")
-        return redirect("students:exams_list")
-
-    if not request.user.session_set.filter(exam=exam, completed=False).exists():
-        if not exam.question_set.filter(deleted=None).exists():
-            raise PermissionDenied()
-
-        Session.objects.create(
-            user=request.user,
-            student=request.user.student,
-            exam=exam,
-            seed=random.randrange(10000),
-            end_time=exam.end_time,
-        )
+    # the version is read under the lock the question changes take, see
+    # Exam.bump_version()
+    with transaction.atomic():
+        exam = Exam.objects.select_for_update().get(pk=exam.pk)
+        if request.user.session_set.filter(exam=exam, completed=True).exists():
+            messages.error(request, "An exam can only be taken once.")
+            return redirect("students:exams_list")
+
+        if not request.user.session_set.filter(exam=exam, completed=False).exists():
+            question_ids = list(
+                exam.question_set.in_version(exam.version).values_list("pk", flat=True)
+            )
+            if not question_ids:
+                raise PermissionDenied()
+
+            seed = random.randrange(10000)
+            random.Random(seed).shuffle(question_ids)
+            Session.objects.create(
+                user=request.user,
+                student=request.user.student,
+                exam=exam,
+                exam_version=exam.version,
+                seed=seed,
+                question_ids=question_ids,
+                end_time=exam.end_time,
+                deadline=min(now + exam.duration, exam.end_time),
+            )
 
     return redirect("exam_start", exam_pk=pk)
 
@@ -67,22 +71,17 @@ def exam_start(request, pk):
 def result_list(request):
     search = request.GET.get("search", None)
     if search:
-        sessions = request.user.session_set.filter(
-            completed=True, exam__show_result=True, exam__name__icontains=search
+        sessions = full_text_search(
+            request.user.session_set.filter(completed=True, exam__show_result=True),
+            search,
+            field="exam__search",
         )
     else:
         sessions = request.user.session_set.filter(
             completed=True, exam__show_result=True
         )
 
-    paginator = Paginator(sessions, 15)
-    page = request.GET.get("page")
-    try:
-        sessions = paginator.page(page)
-    except PageNotAnInteger:
-        sessions = paginator.page(1)
-    except EmptyPage:
-        sessions = paginator.page(paginator.num_pages)
+    sessions = paginate(request, sessions)
 
     return render(request, "students/result_list.html", {"sessions": sessions})
 
@@ -96,20 +95,15 @@ def result_detail(request, pk):
 
     search = request.GET.get("search", None)
     if search:
-        answers = session.answer_set.filter(
-            question__question__icontains=search
-        ).order_by("question__created")
+        answers = full_text_search(
+            session.answer_set.order_by("question__created"),
+            search,
+            field="question__search",
+        )
     else:
         answers = session.answer_set.all().order_by("question__created")
 
-    paginator = Paginator(answers, 15)
-    page = request.GET.get("page")
-    try:
-        answers = paginator.page(page)
-    except PageNotAnInteger:
-        answers = paginator.page(1)
-    except EmptyPage:
-        answers = paginator.page(paginator.num_pages)
+    answers = paginate(request, answers)
 
     context = {"session": session, "answers": answers}
     return render(request, "students/result_detail.html", context)
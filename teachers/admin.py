@@ -1,3 +1,20 @@
 from django.contrib import admin
+from .models import ExportJob
 
-# Register your models here.
+
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = (
+        'exam',
+        'user',
+        'file_format',
+        'status',
+        'num_sessions',
+        'progress',
+        'created',
+        'finished',
+    )
+    list_filter = ('file_format', 'status', 'created')
+    search_fields = ('exam__name', 'user__username')
+
+
+admin.site.register(ExportJob, ExportJobAdmin)
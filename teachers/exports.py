@@ -0,0 +1,162 @@
+import csv
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+EXPORT_CHUNK_SIZE = 2000
+
+RESULT_HEADER = [
+    "PRN",
+    "STUDENT NAME",
+    "COLLEGE",
+    "STANDARD",
+    "BRANCH",
+    "ATTEMPTED QUESTIONS",
+    "TOTAL QUESTIONS",
+    "MARKS OBTAIN",
+    "MAX MARKS",
+    "PASSING PERCENTAGE",
+    "PASSING STATUS",
+    "SUBMITTED ON",
+]
+
+
+def result_rows(exam):
+    # header and one row per completed session, read with a server-side
+    # cursor so only one chunk of sessions is in memory at a time
+    yield RESULT_HEADER
+
+    sessions = exam.session_set.filter(completed=True).select_related("student")
+    for session in sessions.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield [
+            session.student.prn,
+            session.student.full_name,
+            session.student.get_college_display(),
+            session.student.get_standard_display(),
+            session.student.get_branch_display(),
+            session.num_attempted,
+            session.num_total,
+            session.marks,
+            session.max_marks,
+            exam.passing_percentage,
+            "PASS" if session.passed else "FAIL",
+            session.submitted.strftime("%m/%d/%Y"),
+        ]
+
+
+class StreamBuffer:
+    # file-like object which keeps what was written until it is drained
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class _TextWriter:
+    def __init__(self, buffer):
+        self.buffer = buffer
+
+    def write(self, text):
+        return self.buffer.write(text.encode())
+
+
+def stream_csv(rows):
+    buffer = StreamBuffer()
+    writer = csv.writer(_TextWriter(buffer))
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.drain()
+
+
+XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" '
+    'ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    "</Types>"
+)
+XLSX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    "</Relationships>"
+)
+XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>'
+    "</workbook>"
+)
+XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    "</Relationships>"
+)
+XLSX_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    "<sheetData>"
+)
+XLSX_SHEET_END = "</sheetData></worksheet>"
+
+# characters not allowed in xml 1.0
+XML_ILLEGAL_RE = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def xlsx_cell(value):
+    if value is None:
+        return "<c/>"
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f"<c><v>{value}</v></c>"
+    text = escape(XML_ILLEGAL_RE.sub("", str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def stream_xlsx(rows, sheet_name="Results"):
+    # a single sheet workbook with inline strings, written row by row into a
+    # zip which is never seeked, so every row can be sent as soon as it is
+    # compressed
+    buffer = StreamBuffer()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", XLSX_CONTENT_TYPES)
+        archive.writestr("_rels/.rels", XLSX_RELS)
+        archive.writestr(
+            "xl/workbook.xml", XLSX_WORKBOOK.format(name=escape(sheet_name))
+        )
+        archive.writestr("xl/_rels/workbook.xml.rels", XLSX_WORKBOOK_RELS)
+        yield buffer.drain()
+
+        with archive.open("xl/worksheets/sheet1.xml", "w") as sheet:
+            sheet.write(XLSX_SHEET_START.encode())
+            for row in rows:
+                cells = "".join(xlsx_cell(value) for value in row)
+                sheet.write(f"<row>{cells}</row>".encode())
+                # the compressor holds data back until it has enough
+                data = buffer.drain()
+                if data:
+                    yield data
+            sheet.write(XLSX_SHEET_END.encode())
+
+    yield buffer.drain()
@@ -0,0 +1,17 @@
+from django import forms
+from users.models import Student
+
+
+class StudentImportForm(forms.Form):
+    file = forms.FileField(
+        help_text="CSV or XLSX with the columns full_name, email, phone, standard "
+        "and prn. Profiles are created for your college and branch.",
+        widget=forms.ClearableFileInput(attrs={"accept": ".csv,.xlsx"}),
+    )
+
+
+class StudentRowForm(forms.ModelForm):
+    # a row of a roster import
+    class Meta:
+        model = Student
+        fields = ["full_name", "email", "phone", "standard", "prn"]
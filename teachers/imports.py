@@ -0,0 +1,43 @@
+from django.db import transaction
+from core.imports import ImportFileError, get_row_errors, read_table
+from users.models import Student
+from .forms import StudentRowForm
+
+
+def import_students(teacher, upload):
+    # validates every row and either creates all profiles, without users, for
+    # the teacher's college and branch or none. returns the created profiles
+    # or the errors per line.
+    table = read_table(upload.name, upload.read())
+    if not table:
+        raise ImportFileError("The file has no students.")
+
+    prns = {row.get("prn", "").upper() for _, row in table}
+    existing = set(Student.objects.filter(prn__in=prns).values_list("prn", flat=True))
+
+    errors, students, seen = {}, [], set()
+    for line, row in table:
+        data = dict(row, prn=row.get("prn", "").upper())
+        form = StudentRowForm(data)
+        row_errors = get_row_errors(form)
+        prn = data["prn"]
+        if prn in existing:
+            row_errors.append(f"prn: Profile with PRN {prn} already exists.")
+        elif prn in seen:
+            row_errors.append(f"prn: PRN {prn} is repeated in the file.")
+        seen.add(prn)
+        if row_errors:
+            errors[line] = row_errors
+        else:
+            student = form.save(commit=False)
+            student.college = teacher.college
+            student.branch = teacher.branch
+            students.append(student)
+
+    if errors:
+        return [], sorted(errors.items())
+
+    with transaction.atomic():
+        Student.objects.bulk_create(students)
+
+    return students, []
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.5 on 2026-10-18 08:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('teachers', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='last_regraded',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
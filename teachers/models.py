@@ -1,3 +1,68 @@
+from django.contrib.auth import get_user_model
 from django.db import models
+from core.models import Exam
 
-# Create your models here.
+User = get_user_model()
+
+CSV = "csv"
+XLSX = "xlsx"
+
+FORMAT_CHOICES = [
+    (CSV, "CSV"),
+    (XLSX, "Excel"),
+]
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+STATUS_CHOICES = [
+    (PENDING, "Pending"),
+    (RUNNING, "Running"),
+    (DONE, "Done"),
+    (FAILED, "Failed"),
+]
+
+
+class ExportJobQuerySet(models.QuerySet):
+    def reusable(self, exam, file_format, state):
+        # queued, running or finished jobs made of the same results
+        return self.filter(
+            exam=exam,
+            file_format=file_format,
+            status__in=[PENDING, RUNNING, DONE],
+            **state,
+        )
+
+
+class ExportJob(models.Model):
+    created = models.DateTimeField(auto_now_add=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE)
+    file_format = models.CharField(max_length=4, choices=FORMAT_CHOICES)
+    status = models.CharField(max_length=7, choices=STATUS_CHOICES, default=PENDING)
+    # state of the results the file is made of
+    num_sessions = models.PositiveIntegerField()
+    last_submitted = models.DateTimeField(null=True, blank=True)
+    last_regraded = models.DateTimeField(null=True, blank=True)
+    # rows written so far
+    progress = models.PositiveIntegerField(default=0)
+    file = models.FileField(upload_to="exports/", null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    objects = ExportJobQuerySet.as_manager()
+
+    class Meta:
+        ordering = ("-created",)
+
+    def get_progress_percentage(self):
+        if not self.num_sessions:
+            return 100 if self.status == DONE else 0
+        return min(self.progress * 100 // self.num_sessions, 100)
+
+    def get_filename(self):
+        return f"report.{self.file_format}"
+
+    def __str__(self):
+        return f"{self.exam.name} ({self.get_file_format_display()})"
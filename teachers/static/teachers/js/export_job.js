@@ -0,0 +1,39 @@
+jQuery_3_6_0(document).ready(function(){
+
+    const $export_job = jQuery_3_6_0('#export-job');
+    const $status = jQuery_3_6_0('#export-job-status');
+    const $progress = jQuery_3_6_0('#export-job-progress');
+    const $download = jQuery_3_6_0('#export-job-download');
+    const status_url = $export_job.attr('data-status-url');
+    const POLL_INTERVAL = 2000;
+
+    function poll(){
+        jQuery_3_6_0.ajax({
+            type: 'GET',
+            url: status_url,
+            success: function (data){
+                $status.text(data.status.charAt(0).toUpperCase() + data.status.slice(1));
+                $progress.css('width', data.progress + '%');
+                if (data.status == 'done'){
+                    $progress.parent().addClass('d-none');
+                    $download.attr('href', data.download_url).removeClass('d-none');
+                }
+                else if (data.status == 'failed'){
+                    $progress.parent().addClass('d-none');
+                }
+                else{
+                    setTimeout(poll, POLL_INTERVAL);
+                }
+            },
+            error: function(data){
+                console.error('FAILED TO GET EXPORT STATUS');
+                console.error(data);
+            }
+        });
+    }
+
+    const status = $export_job.attr('data-status');
+    if (status == 'pending' || status == 'running'){
+        setTimeout(poll, POLL_INTERVAL);
+    }
+});
@@ -0,0 +1,13 @@
+jQuery_3_6_0(document).ready(function(){
+
+    const $select_all = jQuery_3_6_0('#js-select-all');
+    const $selects = jQuery_3_6_0('.js-select');
+
+    $select_all.change(function(){
+        $selects.prop('checked', $select_all.prop('checked'));
+    });
+
+    $selects.change(function(){
+        $select_all.prop('checked', $selects.length == $selects.filter(':checked').length);
+    });
+});
@@ -0,0 +1,44 @@
+import logging
+import tempfile
+from celery import shared_task
+from django.core.files import File
+from django.utils import timezone
+from .exports import EXPORT_CHUNK_SIZE, result_rows, stream_csv, stream_xlsx
+from .models import CSV, DONE, FAILED, RUNNING, ExportJob
+
+logger = logging.getLogger(__name__)
+
+
+def track_progress(job, rows):
+    # saves the number of rows written after every chunk of sessions
+    for num, row in enumerate(rows):
+        if num and num % EXPORT_CHUNK_SIZE == 0:
+            ExportJob.objects.filter(pk=job.pk).update(progress=num)
+        yield row
+
+
+@shared_task
+def export_results(job_pk):
+    job = ExportJob.objects.select_related("exam").get(pk=job_pk)
+    if job.status == DONE:
+        return
+
+    ExportJob.objects.filter(pk=job.pk).update(status=RUNNING, progress=0)
+    rows = track_progress(job, result_rows(job.exam))
+    stream = stream_csv(rows) if job.file_format == CSV else stream_xlsx(rows)
+    try:
+        with tempfile.TemporaryFile() as f:
+            for chunk in stream:
+                f.write(chunk)
+            job.file.save(job.get_filename(), File(f), save=False)
+    except Exception:
+        logger.exception("Export %d failed", job.pk)
+        ExportJob.objects.filter(pk=job.pk).update(status=FAILED)
+        raise
+
+    ExportJob.objects.filter(pk=job.pk).update(
+        status=DONE,
+        file=job.file.name,
+        progress=job.num_sessions,
+        finished=timezone.now(),
+    )
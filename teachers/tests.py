@@ -1,3 +1,102 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
+from django.urls import reverse
+from users.models import Student, StudentRequest, Teacher, User
+from .imports import import_students
 
-# Create your tests here.
+ROSTER_HEADER = "full_name,email,phone,standard,prn\n"
+
+
+def roster(*rows):
+    return SimpleUploadedFile("roster.csv", (ROSTER_HEADER + "".join(rows)).encode())
+
+
+class StudentImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user("teacher", password="pw", is_teacher=True)
+        cls.teacher = Teacher.objects.create(user=user, college="SITRC", branch="COMP")
+
+    def setUp(self):
+        self.client.force_login(self.teacher.user)
+
+    def test_creates_profiles_for_the_teachers_college_and_branch(self):
+        students, errors = import_students(
+            self.teacher,
+            roster(
+                "Ann Lee,ann@example.com,1234567890,SE,p1\n",
+                "Bob Roy,bob@example.com,1234567891,FE,P2\n",
+            ),
+        )
+
+        self.assertEqual(errors, [])
+        self.assertEqual(
+            sorted(Student.objects.values_list("prn", "college", "branch", "user")),
+            [("P1", "SITRC", "COMP", None), ("P2", "SITRC", "COMP", None)],
+        )
+
+    def test_any_invalid_row_imports_nothing(self):
+        Student.objects.create(
+            full_name="Old", email="old@example.com", phone="1234567890", prn="P3"
+        )
+        students, errors = import_students(
+            self.teacher,
+            roster(
+                "Ann Lee,ann@example.com,1234567890,SE,P1\n",
+                "Bob Roy,bob@example.com,12345,FE,P2\n",
+                "Cy Old,cy@example.com,1234567892,FE,P3\n",
+                "Ann Two,ann2@example.com,1234567893,FE,P1\n",
+            ),
+        )
+
+        self.assertEqual(students, [])
+        self.assertEqual([line for line, _ in errors], [3, 4, 5])
+        self.assertIn("prn: Profile with PRN P3 already exists.", errors[1][1])
+        self.assertIn("prn: PRN P1 is repeated in the file.", errors[2][1])
+        self.assertEqual(Student.objects.count(), 1)
+
+    def test_imported_profiles_are_listed(self):
+        response = self.client.post(
+            reverse("teachers:student_import"),
+            {"file": roster("Ann Lee,ann@example.com,1234567890,SE,P1\n")},
+            follow=True,
+        )
+
+        self.assertContains(response, "Ann Lee")
+        self.assertContains(response, "Not signed up")
+        response = self.client.get(reverse("teachers:students_list"), {"search": "ann"})
+        self.assertContains(response, "Ann Lee")
+
+
+class StudentRequestAcceptBulkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user("teacher", password="pw", is_teacher=True)
+        cls.teacher = Teacher.objects.create(user=user, college="SITRC", branch="COMP")
+        cls.request = StudentRequest.objects.create(
+            user=User.objects.create_user("ann", password="pw", is_student=True),
+            full_name="Ann Lee",
+            email="ann@example.com",
+            phone="1234567890",
+            prn="P1",
+        )
+
+    def setUp(self):
+        self.client.force_login(self.teacher.user)
+
+    def test_accepts_the_selected_requests(self):
+        response = self.client.post(
+            reverse("teachers:student_request_accept_bulk"), {"pks": [self.request.pk]}
+        )
+
+        self.assertRedirects(response, reverse("teachers:students_request_list"))
+        self.assertTrue(Student.objects.filter(user=self.request.user).exists())
+
+    def test_ignores_invalid_ids(self):
+        response = self.client.post(
+            reverse("teachers:student_request_accept_bulk"),
+            {"pks": ["abc", self.request.pk]},
+        )
+
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(Student.objects.filter(user=self.request.user).exists())
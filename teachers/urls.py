@@ -5,6 +5,7 @@ app_name = "teachers"
 
 urlpatterns = [
     path("student-profiles/", students_list, name="students_list"),
+    path("student-typeahead/", student_typeahead, name="student_typeahead"),
     path("student-requests/", students_request_list, name="students_request_list"),
     path("student-delete/<int:pk>/", student_delete, name="student_delete"),
     path(
@@ -12,11 +13,23 @@ urlpatterns = [
         student_request_accept,
         name="student_request_accept",
     ),
+    path(
+        "student-request-accept/",
+        student_request_accept_bulk,
+        name="student_request_accept_bulk",
+    ),
+    path("student-import/", student_import, name="student_import"),
     path("exams/<int:exam_pk>/results/", result_list, name="result_list"),
     path(
         "exams/<int:exam_pk>/results/export/",
-        result_list_export_excel,
-        name="result_list_export_excel",
+        result_list_export,
+        name="result_list_export",
+    ),
+    path("exports/<int:pk>/", export_job_status, name="export_job_status"),
+    path(
+        "exports/<int:pk>/download/",
+        export_job_download,
+        name="export_job_download",
     ),
     path("results/<int:pk>/", result_detail, name="result_detail"),
 ]
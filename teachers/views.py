@@ -1,45 +1,82 @@
-import io
-import xlwt
 from django.contrib import messages
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from django.db.models import Q
-from django.http import FileResponse
+from django.db import transaction
+from django.http import FileResponse, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.defaultfilters import pluralize
+from django.urls import reverse
 from django.views.decorators.http import require_POST
 from core.decorators import *
+from core.pagination import paginate
+from core.imports import ImportFileError
 from core.models import Exam, Session
+from core.search import full_text_search
 from users.models import Student, StudentRequest
+from users.search import (
+    TYPEAHEAD_LIMIT,
+    TYPEAHEAD_MIN_LENGTH,
+    student_search,
+    user_search,
+)
+from .forms import StudentImportForm
+from .imports import import_students
+from .models import DONE, FORMAT_CHOICES, ExportJob
+from .tasks import export_results
 
 User = get_user_model()
 
+# ?sort= values of the result list
+RESULT_SORTS = {
+    "marks": "marks",
+    "-marks": "-marks",
+    "prn": "student__prn",
+    "-prn": "-student__prn",
+    "submitted": "submitted",
+    "-submitted": "-submitted",
+}
+
 
 @login_required
 @is_verified_teacher
 def students_list(request):
     teacher = request.user.teacher
     search = request.GET.get("search", None)
-    students = User.objects.filter(
-        student__college=teacher.college,
-        student__branch=teacher.branch,
-    )
+    # the profiles of imported rosters have no user until the student signs up
+    students = Student.objects.filter(
+        college=teacher.college,
+        branch=teacher.branch,
+    ).select_related("user")
     if search:
-        students = students.filter(Q(username__icontains=search) | Q(email__icontains=search))
+        students = students.filter(student_search(search))
 
-    paginator = Paginator(students, 15)
-    page = request.GET.get("page")
-    try:
-        students = paginator.page(page)
-    except PageNotAnInteger:
-        students = paginator.page(1)
-    except EmptyPage:
-        students = paginator.page(paginator.num_pages)
+    students = paginate(request, students, count=True)
 
     return render(request, "teachers/students_list.html", {"students": students})
 
 
+@login_required
+@is_verified_teacher
+def student_typeahead(request):
+    # suggestions for the roster search box, by prefix
+    teacher = request.user.teacher
+    query = request.GET.get("q", "").strip()
+    if len(query) < TYPEAHEAD_MIN_LENGTH:
+        return JsonResponse({"results": []})
+
+    students = Student.objects.filter(
+        student_search(query, lookup="istartswith"),
+        college=teacher.college,
+        branch=teacher.branch,
+    ).order_by("full_name")[:TYPEAHEAD_LIMIT]
+    results = [
+        {"value": student.prn, "label": f"{student.full_name} ({student.prn})"}
+        for student in students
+    ]
+    return JsonResponse({"results": results})
+
+
 @require_POST
 @login_required
 @is_verified_teacher
@@ -68,16 +105,9 @@ def students_request_list(request):
         studentrequest__branch=teacher.branch,
     )
     if search:
-        students = students.filter(Q(username__icontains=search) | Q(email__icontains=search))
+        students = students.filter(user_search(search, StudentRequest))
 
-    paginator = Paginator(students, 15)
-    page = request.GET.get("page")
-    try:
-        students = paginator.page(page)
-    except PageNotAnInteger:
-        students = paginator.page(1)
-    except EmptyPage:
-        students = paginator.page(paginator.num_pages)
+    students = paginate(request, students, count=True)
 
     return render(
         request, "teachers/students_request_list.html", {"students": students}
@@ -96,97 +126,164 @@ def student_request_accept(request, pk):
     ):
         raise PermissionDenied()
 
-    if Student.objects.exclude(user=None).filter(prn=studentrequest.prn).exists():
+    accepted, refused = StudentRequest.objects.filter(pk=studentrequest.pk).accept()
+    if refused:
         messages.error(
             request,
             f"Profile with PRN {studentrequest.prn} already exists, please delete it first",
         )
     else:
-        Student.objects.create(
-            user=studentrequest.user,
-            full_name=studentrequest.full_name,
-            email=studentrequest.email,
-            phone=studentrequest.phone,
-            college=studentrequest.college,
-            standard=studentrequest.standard,
-            branch=studentrequest.branch,
-            prn=studentrequest.prn,
-        )
-        studentrequest.delete()
         messages.success(request, "Profile request accepted")
 
     return redirect("teachers:students_request_list")
 
 
+@require_POST
+@login_required
+@is_verified_teacher
+def student_request_accept_bulk(request):
+    teacher = request.user.teacher
+    # tampered ids are ignored rather than failing the query
+    pks = [pk for pk in request.POST.getlist("pks") if pk.isdigit()]
+    accepted, refused = StudentRequest.objects.filter(
+        pk__in=pks,
+        college=teacher.college,
+        branch=teacher.branch,
+    ).accept()
+
+    if accepted:
+        messages.success(
+            request,
+            f"{len(accepted)} profile request{pluralize(len(accepted))} accepted",
+        )
+    if refused:
+        messages.error(
+            request,
+            f"Profiles with PRN {', '.join(refused)} already exist, please delete them first",
+        )
+
+    return redirect("teachers:students_request_list")
+
+
+@login_required
+@is_verified_teacher
+def student_import(request):
+    teacher = request.user.teacher
+    errors = []
+    if request.method == "POST":
+        form = StudentImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            try:
+                students, errors = import_students(teacher, form.cleaned_data["file"])
+            except ImportFileError as e:
+                form.add_error("file", str(e))
+            else:
+                if not errors:
+                    messages.success(
+                        request, f"{len(students)} student profiles imported successfully"
+                    )
+                    return redirect("teachers:students_list")
+    else:
+        form = StudentImportForm()
+
+    context = {"form": form, "errors": errors}
+    return render(request, "teachers/student_import.html", context)
+
+
 @login_required
 @is_verified_teacher
 def result_list(request, exam_pk):
     exam = get_object_or_404(Exam, pk=exam_pk)
     if exam.user != request.user:
         raise PermissionDenied()
-    sessions = exam.session_set.filter(completed=True)
+    sessions = exam.session_set.filter(completed=True).select_related("student")
     active_sessions = exam.session_set.filter(completed=False).count()
 
-    paginator = Paginator(sessions, 15)
-    page = request.GET.get("page")
+    status = request.GET.get("status", None)
+    if status == "pass":
+        sessions = sessions.filter(passed=True)
+    elif status == "fail":
+        sessions = sessions.filter(passed=False)
+    try:
+        min_marks = float(request.GET.get("min_marks", ""))
+        sessions = sessions.filter(marks__gte=min_marks)
+    except ValueError:
+        min_marks = None
     try:
-        sessions = paginator.page(page)
-    except PageNotAnInteger:
-        sessions = paginator.page(1)
-    except EmptyPage:
-        sessions = paginator.page(paginator.num_pages)
+        max_marks = float(request.GET.get("max_marks", ""))
+        sessions = sessions.filter(marks__lte=max_marks)
+    except ValueError:
+        max_marks = None
+
+    sort = request.GET.get("sort", None)
+    if sort in RESULT_SORTS:
+        sessions = sessions.order_by(RESULT_SORTS[sort], "-pk")
+
+    sessions = paginate(request, sessions, count=True)
 
     context = {
         "exam": exam,
         "sessions": sessions,
         "active_sessions": active_sessions,
+        "status": status,
+        "min_marks": min_marks,
+        "max_marks": max_marks,
+        "sort": sort,
+        "export_job": ExportJob.objects.filter(exam=exam, user=request.user).first(),
     }
     return render(request, "teachers/result_list.html", context)
 
 
+@require_POST
 @login_required
 @is_verified_teacher
-def result_list_export_excel(request, exam_pk):
+def result_list_export(request, exam_pk):
     exam = get_object_or_404(Exam, pk=exam_pk)
     if exam.user != request.user:
         raise PermissionDenied()
-    sessions = exam.session_set.filter(completed=True).select_related("student", "exam")
-
-    workbook = xlwt.Workbook()
-    worksheet = workbook.add_sheet("Results")
-    worksheet.write(0, 0, "PRN")
-    worksheet.write(0, 1, "STUDENT NAME")
-    worksheet.write(0, 2, "COLLEGE")
-    worksheet.write(0, 3, "STANDARD")
-    worksheet.write(0, 4, "BRANCH")
-    worksheet.write(0, 5, "ATTEMPTED QUESTIONS")
-    worksheet.write(0, 6, "TOTAL QUESTIONS")
-    worksheet.write(0, 7, "MARKS OBTAIN")
-    worksheet.write(0, 8, "MAX MARKS")
-    worksheet.write(0, 9, "PASSING PERCENTAGE")
-    worksheet.write(0, 10, "PASSING STATUS")
-    worksheet.write(0, 11, "SUBMITTED ON")
-
-    for row, session in enumerate(sessions, start=1):
-        worksheet.write(row, 0, session.student.prn)
-        worksheet.write(row, 1, session.student.full_name)
-        worksheet.write(row, 2, session.student.get_college_display())
-        worksheet.write(row, 3, session.student.get_standard_display())
-        worksheet.write(row, 4, session.student.get_branch_display())
-        worksheet.write(row, 5, session.get_num_attempted_que())
-        worksheet.write(row, 6, session.get_num_total_que())
-        worksheet.write(row, 7, session.get_marks())
-        worksheet.write(row, 8, session.get_max_marks())
-        worksheet.write(row, 9, session.exam.passing_percentage)
-        passing_status = session.get_passing_status()
-        passing_status = "PASS" if passing_status else "FAIL"
-        worksheet.write(row, 10, passing_status)
-        worksheet.write(row, 11, session.submitted.strftime("%m/%d/%Y"))
-
-    buffer = io.BytesIO()
-    workbook.save(buffer)
-    buffer.seek(0)
-    return FileResponse(buffer, as_attachment=True, filename="report.xlsx")
+    file_format = request.POST.get("file_format")
+    if file_format not in dict(FORMAT_CHOICES):
+        return HttpResponseBadRequest("Invalid file format")
+
+    # reuse the file of an earlier export when no session was submitted since
+    state = exam.get_results_state()
+    job = ExportJob.objects.reusable(exam, file_format, state).first()
+    if job is None:
+        job = ExportJob.objects.create(
+            user=request.user, exam=exam, file_format=file_format, **state
+        )
+        transaction.on_commit(lambda: export_results.delay(job.pk))
+        messages.success(request, "Export started")
+
+    return redirect("teachers:result_list", exam_pk=exam.pk)
+
+
+@login_required
+@is_verified_teacher
+def export_job_status(request, pk):
+    job = get_object_or_404(ExportJob, pk=pk)
+    if job.exam.user != request.user:
+        raise PermissionDenied()
+
+    return JsonResponse(
+        {
+            "status": job.status,
+            "progress": job.get_progress_percentage(),
+            "download_url": reverse("teachers:export_job_download", args=[job.pk])
+            if job.status == DONE
+            else None,
+        }
+    )
+
+
+@login_required
+@is_verified_teacher
+def export_job_download(request, pk):
+    job = get_object_or_404(ExportJob, pk=pk, status=DONE)
+    if job.exam.user != request.user:
+        raise PermissionDenied()
+
+    return FileResponse(job.file.open("rb"), as_attachment=True, filename=job.get_filename())
 
 
 @login_required
@@ -198,20 +295,15 @@ def result_detail(request, pk):
 
     search = request.GET.get("search", None)
     if search:
-        answers = session.answer_set.filter(
-            question__question__icontains=search
-        ).order_by("question__created")
+        answers = full_text_search(
+            session.answer_set.order_by("question__created"),
+            search,
+            field="question__search",
+        )
     else:
         answers = session.answer_set.all().order_by("question__created")
 
-    paginator = Paginator(answers, 15)
-    page = request.GET.get("page")
-    try:
-        answers = paginator.page(page)
-    except PageNotAnInteger:
-        answers = paginator.page(1)
-    except EmptyPage:
-        answers = paginator.page(paginator.num_pages)
+    answers = paginate(request, answers)
 
     context = {"session": session, "answers": answers}
     return render(request, "teachers/result_detail.html", context)
@@ -0,0 +1,28 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# icontains and istartswith compare UPPER(column) with LIKE, which a trigram
+# index on the same expression answers without scanning the table
+INDEXES = [
+    ("users_user_username_trgm", "users_user", "username"),
+    ("users_user_email_trgm", "users_user", "email"),
+    ("users_student_full_name_trgm", "users_student", "full_name"),
+    ("users_student_prn_trgm", "users_student", "prn"),
+    ("users_studentrequest_full_name_trgm", "users_studentrequest", "full_name"),
+    ("users_studentrequest_prn_trgm", "users_studentrequest", "prn"),
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_auto_20220904_2005'),
+    ]
+
+    operations = [TrigramExtension()] + [
+        migrations.RunSQL(
+            f'CREATE INDEX {name} ON {table} USING gin (UPPER("{column}"::text) gin_trgm_ops);',
+            f'DROP INDEX {name};',
+        )
+        for name, table, column in INDEXES
+    ]
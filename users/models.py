@@ -1,6 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator, MinLengthValidator, RegexValidator
-from django.db import models
+from django.db import models, transaction
 
 
 COLLEGE_CHOICES = (
@@ -83,6 +83,52 @@ class Student(models.Model):
         return f"{self.get_college_display()} - {self.get_standard_display()} - {self.get_branch_display()}"
 
 
+class StudentRequestQuerySet(models.QuerySet):
+    def accept(self):
+        # turns the requests into profiles in one transaction. a request is
+        # refused when a profile with its prn is already linked to a user,
+        # a profile without a user (imported roster) gets linked instead.
+        # returns the accepted requests and the refused prns.
+        with transaction.atomic():
+            requests = list(self.select_for_update())
+            profiles = Student.objects.filter(prn__in={r.prn for r in requests})
+            linked, unlinked = set(), {}
+            for pk, prn, user_id in profiles.values_list("pk", "prn", "user_id"):
+                if user_id:
+                    linked.add(prn)
+                else:
+                    unlinked.setdefault(prn, pk)
+
+            accepted, refused, created, updated = [], set(), [], []
+            for r in requests:
+                if r.prn in linked:
+                    refused.add(r.prn)
+                    continue
+                linked.add(r.prn)
+                accepted.append(r)
+                if r.prn in unlinked:
+                    updated.append(Student(pk=unlinked[r.prn], user_id=r.user_id))
+                else:
+                    created.append(
+                        Student(
+                            user_id=r.user_id,
+                            full_name=r.full_name,
+                            email=r.email,
+                            phone=r.phone,
+                            college=r.college,
+                            standard=r.standard,
+                            branch=r.branch,
+                            prn=r.prn,
+                        )
+                    )
+
+            Student.objects.bulk_create(created)
+            Student.objects.bulk_update(updated, ["user"])
+            StudentRequest.objects.filter(pk__in=[r.pk for r in accepted]).delete()
+
+        return accepted, sorted(refused)
+
+
 class StudentRequest(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     full_name = models.CharField(max_length=200)
@@ -113,6 +159,8 @@ class StudentRequest(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
+    objects = StudentRequestQuerySet.as_manager()
+
     class Meta:
         ordering = ("-created",)
 
@@ -0,0 +1,37 @@
+from django.db.models import Q
+from .models import Student, User
+
+TYPEAHEAD_MIN_LENGTH = 2
+TYPEAHEAD_LIMIT = 10
+
+
+def user_search(text, profile=None, lookup="icontains"):
+    # users whose username or email, or full name or prn on the profile
+    # model, match text. each table is searched on its own so that every
+    # part uses the trigram indexes (users migration 0008) and the matches
+    # are combined by primary key instead of filtering over the joins.
+    users = User.objects.filter(
+        Q(**{f"username__{lookup}": text}) | Q(**{f"email__{lookup}": text})
+    ).values("pk").order_by()
+    if profile is not None:
+        profiles = profile.objects.filter(
+            Q(**{f"full_name__{lookup}": text}) | Q(**{f"prn__{lookup}": text})
+        ).values("user_id").order_by()
+        users = users.union(profiles)
+
+    return Q(pk__in=users)
+
+
+def student_search(text, lookup="icontains"):
+    # profiles, imported ones without a user included, whose full name or
+    # prn, or the username or email of their user, match text. searched
+    # table by table like user_search.
+    users = User.objects.filter(
+        Q(**{f"username__{lookup}": text}) | Q(**{f"email__{lookup}": text})
+    ).values("pk").order_by()
+    profiles = Student.objects.filter(
+        Q(**{f"full_name__{lookup}": text}) | Q(**{f"prn__{lookup}": text})
+    ).values("pk").order_by()
+    linked = Student.objects.filter(user__in=users).values("pk").order_by()
+
+    return Q(pk__in=profiles.union(linked))
@@ -1,3 +1,52 @@
 from django.test import TestCase
+from .models import Student, StudentRequest, User
 
-# Create your tests here.
+
+def create_request(username, prn):
+    return StudentRequest.objects.create(
+        user=User.objects.create_user(username, password="pw", is_student=True),
+        full_name=username,
+        email=f"{username}@example.com",
+        phone="1234567890",
+        prn=prn,
+    )
+
+
+class StudentRequestAcceptTests(TestCase):
+    def test_creates_profiles(self):
+        request = create_request("ann", "P1")
+
+        accepted, refused = StudentRequest.objects.all().accept()
+
+        self.assertEqual((accepted, refused), ([request], []))
+        self.assertEqual(Student.objects.get(user=request.user).prn, "P1")
+        self.assertFalse(StudentRequest.objects.exists())
+
+    def test_links_an_imported_profile(self):
+        imported = Student.objects.create(
+            full_name="Ann Lee", email="ann@example.com", phone="1234567890", prn="P1"
+        )
+        request = create_request("ann", "P1")
+
+        StudentRequest.objects.all().accept()
+
+        imported.refresh_from_db()
+        self.assertEqual(imported.user, request.user)
+        self.assertEqual(Student.objects.count(), 1)
+
+    def test_refuses_a_prn_linked_to_another_user(self):
+        Student.objects.create(
+            user=User.objects.create_user("old", password="pw", is_student=True),
+            full_name="Old",
+            email="old@example.com",
+            phone="1234567890",
+            prn="P1",
+        )
+        create_request("ann", "P1")
+        create_request("bob", "P2")
+
+        accepted, refused = StudentRequest.objects.all().accept()
+
+        self.assertEqual([r.prn for r in accepted], ["P2"])
+        self.assertEqual(refused, ["P1"])
+        self.assertEqual(StudentRequest.objects.get().prn, "P1")